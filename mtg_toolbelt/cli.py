@@ -1,11 +1,11 @@
 from datetime import date, timedelta
-import json
 import typer
 from pathlib import Path
 from mtg_toolbelt.database import cards
 from mtg_toolbelt.metagame import mtgo_standings, metagame
+from mtg_toolbelt.models import Deck
 from mtg_toolbelt.mtgo import exporter, deck_data
-from mtg_toolbelt.simulation import mana
+from mtg_toolbelt.simulation import mana, optimizer
 from mtg_toolbelt.utils import load_config, setup_dir
 
 
@@ -18,10 +18,10 @@ app = typer.Typer()
 
 
 @app.command()
-def update_db():
-    """Create or update card database from Scryfall (JSON)."""
+def update_db(force: bool = False):
+    """Create or update card database from Scryfall (SQLite)."""
     db_path = Path(data_files_path) / 'db'
-    cards.update_db(db_path)
+    cards.update_db(db_path, force=force)
 
 
 @app.command()
@@ -52,14 +52,26 @@ def organize(format_: str = 'pauper'):
     
 
 @app.command()
-def update_decks():
-    """Create deck data files (JSON)."""
+def update_decks(price_ttl: float = 24, static_ttl: float = 30 * 24, workers: int = 8, full: bool = False,
+                 output_format: str = None):
+    """Create deck data files (JSON), only reprocessing new or modified decks unless --full is given. Cached card
+    prices and card data are refreshed after the given hours. --output-format (json, orjson or msgpack) also saves
+    compact normalized deck data."""
     deck_data.create_json(decks_path=decks_path)
-    deck_data.parse_deck_files(decks_path=decks_path)
+    deck_data.parse_deck_files(decks_path=decks_path, db_path=Path(data_files_path) / 'db' / 'cards.sqlite',
+                               static_ttl=static_ttl * 3600, price_ttl=price_ttl * 3600, workers=workers,
+                               full=full, output_format=output_format)
 
 
 @app.command()
-def standings(format_: str, start_date: str = None, end_date: str = None, show: bool = False):
+def refresh_prices():
+    """Refresh card and deck prices in the deck data files from the card database (run update-db first)."""
+    deck_data.refresh_prices(decks_path=decks_path, db_path=Path(data_files_path) / 'db' / 'cards.sqlite')
+
+
+@app.command()
+def standings(format_: str, start_date: str = None, end_date: str = None, show: bool = False, workers: int = 8,
+              parser: str = None, stream: bool = False):
     """Scrape decklists from MTGO standings provided by magic.wizards.com."""
     if not end_date:
         end_date = date.today().strftime("%Y-%m-%d")
@@ -70,7 +82,13 @@ def standings(format_: str, start_date: str = None, end_date: str = None, show:
     metagame_path = Path(data_files_path) / 'metagame'
     setup_dir(metagame_path)
 
-    decks = mtgo_standings.scrape_decklists(start_date, end_date, format_, metagame_path)
+    if stream:
+        mtgo_standings.stream_decklists(start_date, end_date, format_, metagame_path, workers=workers, parser=parser)
+        _, deck_dicts = mtgo_standings.read_stream(metagame_path / mtgo_standings.STREAM_FILE)
+        decks = (Deck.from_dict(deck_dict) for deck_dict in deck_dicts)
+    else:
+        decks = mtgo_standings.scrape_decklists(start_date, end_date, format_, metagame_path, workers=workers,
+                                                parser=parser)
 
     # Display deck lists in terminal
     if show:
@@ -91,33 +109,32 @@ def meta(sideboard: bool = False, total_count: bool = False, top: int = 25):
     else:
         rank = 'unique_count'
 
-    # Load standings
-    standings_path = Path(data_files_path) / 'metagame' / 'standings.json'
-    with open(standings_path, 'r') as f:
-        standings_dict = json.load(f)
-        decks = standings_dict['decks']
+    # Load standings (decks are read lazily from a standings stream)
+    standings_dict, decks = mtgo_standings.load_standings(Path(data_files_path) / 'metagame')
 
-    # Ranks cards
-    card_rank = metagame.get_card_counts(decks, board=board, rank=rank)
+    # Ranks cards (only the top cards are sorted)
+    card_counts = metagame.CardCounts(decks, boards=[board])
+    card_rank = card_counts.top(board=board, rank=rank, k=top)
 
     # Print results
-    print(f"{standings_dict['format'].upper()} METAGAME ({standings_dict['n_decks']} decks)")
+    print(f"{standings_dict['format'].upper()} METAGAME ({card_counts.n_decks} decks)")
     print(f"- from {standings_dict['start_date']} to {standings_dict['end_date']}")
     print(f"- {board} only, sorted by {rank.replace('_', ' ')}\n")
     print('Rank', 'Total', 'Unique', 'Freq(%)', 'Card')
-    i = 1
-    for card, count in card_rank.items():
-        if i == top + 1:
-            break
-        freq = count['unique_count'] / len(decks) * 100
+    for i, (card, count) in enumerate(card_rank, start=1):
+        freq = count['frequency'] * 100
         print(f"{(str(i) + ')').ljust(4)} {str(count['total_count']).ljust(5)} {str(count['unique_count']).ljust(6)} {freq:<7.1f} {card}")
-        i += 1
     print()
 
 
 @app.command()
-def mana_sim(deck_size: int = 60, turns: int = 7, on_play: bool = False, mulligans: bool = True, iterations: int = 10000):
+def mana_sim(deck_size: int = 60, turns: int = 7, on_play: bool = False, mulligans: bool = True, iterations: int = None,
+             engine: str = 'python', workers: int = 1, seed: int = None, shared_games: bool = False,
+             precision: float = mana.PRECISION, cache: bool = True):
     """Run simulation to create a mana curve table (CSV)."""
+    # Games per cell, or maximum games per cell with the adaptive engine
+    if iterations is None:
+        iterations = mana.MAX_ITERATIONS if engine == 'adaptive' and not shared_games else 10000
     sim_path = Path(data_files_path) / 'simulations'
     setup_dir(sim_path)
 
@@ -128,9 +145,46 @@ def mana_sim(deck_size: int = 60, turns: int = 7, on_play: bool = False, mulliga
         turns=turns,
         on_play=on_play,
         consider_mulligans=mulligans,
-        iterations=iterations
+        iterations=iterations,
+        engine=engine,
+        workers=workers,
+        seed=seed,
+        shared_games=shared_games,
+        precision=precision,
+        cache_dir=sim_path / 'cache' if cache else None
     )
 
 
+@app.command()
+def optimize_lands(target: float = 0.9, turn: int = 4, lands: int = None, mana_cost: str = None, deck_size: int = 60,
+                   on_play: bool = False, mulligans: bool = True):
+    """Find the number of lands (and colored sources) to reach a target probability."""
+    result = optimizer.optimize(
+        target=target,
+        turn=turn,
+        mana_cost=mana_cost,
+        n_lands_needed=lands,
+        deck_size=deck_size,
+        on_play=on_play,
+        consider_mulligans=mulligans
+    )
+
+    goal = f"cast {mana_cost}" if mana_cost else f"hit {lands or turn} lands"
+    print(f"{target:.0%} to {goal} by turn {turn} ({'on the play' if on_play else 'on the draw'}, {deck_size} card deck)")
+    if result['n_lands'] is None:
+        print("- Target can not be reached.")
+        return
+    print(f"- Lands: {result['n_lands']}")
+    for color, sources in result['sources'].items():
+        print(f"- {color} sources: {sources if sources is not None else 'target can not be reached'}")
+    if 'lands' in result:
+        lands = ', '.join(f"{count} {colors}" for colors, count in result['lands'].items())
+        print(f"- All colors at once: {result['prob']:.1%} with lands {lands} (simulated)")
+        if result['multicolor_lands']:
+            print("- More sources than lands: needs lands that make several colors.")
+        if not result['target_met']:
+            print("- Target can not be reached with all colors at once.")
+
+
 def cli():
     app()
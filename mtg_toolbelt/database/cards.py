@@ -1,49 +1,183 @@
 import json
+import os
 from pathlib import Path
-import requests
+import re
+from mtg_toolbelt.database import scryfall, store
 from mtg_toolbelt.utils import setup_dir
 
 
-def get_bulk_data_url():
+# Scryfall API (can be pointed to a local server for testing)
+SCRYFALL_API_URL = scryfall.API_URL
+
+# Size of the chunks used to download and parse the bulk data file
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_bulk_data(bulk_type='oracle-cards', api_url=SCRYFALL_API_URL):
+    """Scryfall API request to get the metadata of a bulk data file (download_uri, updated_at, size, ...)."""
+    return scryfall.get_client(api_url).bulk_data(bulk_type)
+
+
+def get_bulk_data_url(api_url=SCRYFALL_API_URL):
     """Scryfall API request to get the URL of the bulk card data."""
-    scryfall_oracle_url = 'https://api.scryfall.com/bulk-data/oracle-cards'
-    r = requests.get(scryfall_oracle_url)
-    return r.json()['download_uri']
+    return get_bulk_data('oracle-cards', api_url=api_url)['download_uri']
+
+
+def load_manifest(db_dir: Path):
+    """Load the manifest with the metadata of the downloaded bulk data files."""
+    try:
+        with open(db_dir / 'manifest.json', 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(db_dir: Path, manifest):
+    """Save the manifest, replacing the previous one atomically."""
+    tmp_path = db_dir / 'manifest.json.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, db_dir / 'manifest.json')
+
+
+def _same_version(entry, bulk_data):
+    return entry is not None and entry['updated_at'] == bulk_data['updated_at'] and entry['size'] == bulk_data.get('size')
+
+
+def scryfall_db_download(file_path: Path, bulk_data=None, force=False, api_url=SCRYFALL_API_URL):
+    """Download data from URL and save to filepath. The file is streamed to disk in chunks.
 
+    The metadata of the downloaded file is kept in a manifest next to it, and the download is skipped if
+    Scryfall has not published a new file since. Data is first downloaded to a .part file, which is resumed
+    if a previous download of the same file was interrupted. It only replaces file_path once its size is
+    verified.
 
-def scryfall_db_download(file_path: Path):
-    """Download data from URL and save to filepath."""
-    download_uri = get_bulk_data_url()
-    with open(file_path, "wb") as file:
-        response = requests.get(download_uri)
-        file.write(response.content)
+    RETURNS:
+        bool
+            True if a new file was downloaded, False if the local file is up to date.
+    """
+    if bulk_data is None:
+        bulk_data = get_bulk_data('oracle-cards', api_url=api_url)
+    db_dir = file_path.parent
+    manifest = load_manifest(db_dir)
+    version = {'updated_at': bulk_data['updated_at'], 'size': bulk_data.get('size'),
+               'download_uri': bulk_data['download_uri']}
 
+    # Skip download if the local file is up to date
+    if not force and file_path.exists() and _same_version(manifest.get(file_path.name), bulk_data):
+        return False
 
-def update_db(db_dir: Path):
-    """Create or update database."""
+    # Resume a partial download of the same file
+    part_path = file_path.with_name(file_path.name + '.part')
+    headers = {'Accept-Encoding': 'identity'}  # byte ranges refer to the file as stored on the server
+    if part_path.exists() and _same_version(manifest.get(part_path.name), bulk_data):
+        headers['Range'] = f'bytes={part_path.stat().st_size}-'
+    else:
+        part_path.unlink(missing_ok=True)
+        manifest[part_path.name] = version
+        save_manifest(db_dir, manifest)
+
+    with scryfall.get_client(api_url).get(bulk_data['download_uri'], headers=headers, stream=True) as response:
+        if response.status_code == 416:  # nothing left to download
+            mode = None
+        else:
+            response.raise_for_status()
+            mode = 'ab' if response.status_code == 206 else 'wb'  # the server may ignore the range
+        if mode:
+            with open(part_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    file.write(chunk)
+
+    # Verify integrity before replacing the previous file
+    size = part_path.stat().st_size
+    if bulk_data.get('size') is not None and size != bulk_data['size']:
+        part_path.unlink()
+        manifest.pop(part_path.name, None)
+        save_manifest(db_dir, manifest)
+        raise IOError(f"Downloaded file has {size} bytes, expected {bulk_data['size']}.")
+    with open(part_path, 'r', encoding='utf-8') as f:
+        for _ in iter_json_array(f):
+            pass
+
+    os.replace(part_path, file_path)
+    manifest.pop(part_path.name, None)
+    manifest[file_path.name] = version
+    save_manifest(db_dir, manifest)
+    return True
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Iterate over the items of a JSON array in a text file, reading it in chunks.
+
+    Only one chunk and one item are in memory at a time, no matter the size of the file.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'[\s,]*')
+
+    buffer = ''
+    while not buffer:
+        chunk = file.read(chunk_size)
+        buffer = chunk.lstrip()
+        if not chunk:
+            break
+    if not buffer.startswith('['):
+        raise ValueError('File does not contain a JSON array.')
+    pos = 1
+    eof = False
+    while True:
+        pos = whitespace.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # An item that ends with the buffer may continue in the next chunk (e.g. a number)
+            if end < len(buffer) or eof:
+                yield item
+                pos = end
+                continue
+        except json.JSONDecodeError:
+            if eof:
+                raise
+        # Item is incomplete, read another chunk
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def update_db(db_dir: Path, force=False, api_url=SCRYFALL_API_URL):
+    """Create or update database. Does nothing if the Scryfall data has not changed, unless force is True.
+
+    Uses the oracle_cards bulk data (one object per card) for card data and the default_cards bulk data
+    (one object per print) for prices. The versions of the bulk data files the database was built from are
+    only recorded in the manifest once the build succeeds, so a failed build is retried on the next run.
+    """
     setup_dir(db_dir)
 
     # Download Scryfall data
     oracle_file_path = db_dir / 'oracle-cards.json'
-    scryfall_db_download(oracle_file_path)
-
-    # Load Scryfall data
-    with open(oracle_file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Create cards dict
-    cards_dict = dict()
-    for card in data:
-        cards_dict[card['name']] = card
+    default_file_path = db_dir / 'default-cards.json'
+    card_db_path = db_dir / 'cards.sqlite'
+    oracle_bulk_data = get_bulk_data('oracle-cards', api_url=api_url)
+    default_bulk_data = get_bulk_data('default-cards', api_url=api_url)
+    scryfall_db_download(oracle_file_path, bulk_data=oracle_bulk_data, force=force, api_url=api_url)
+    scryfall_db_download(default_file_path, bulk_data=default_bulk_data, force=force, api_url=api_url)
+    manifest = load_manifest(db_dir)
+    built_from = {path.name: manifest[path.name] for path in (oracle_file_path, default_file_path)}
+    if not force and card_db_path.exists() and manifest.get(card_db_path.name) == built_from:
+        print(f"Card database is up to date (Scryfall data from {oracle_bulk_data['updated_at']}).")
+        return
 
-    # Save to JSON
-    card_json_file_path = db_dir / 'card-db.json'
-    with open(card_json_file_path, 'w', encoding='utf-8') as f:
-        json.dump(cards_dict, f)
+    # Load Scryfall data card by card into the indexed card store
+    with open(oracle_file_path, 'r', encoding='utf-8') as f_oracle, \
+            open(default_file_path, 'r', encoding='utf-8') as f_default:
+        n_cards = store.build(card_db_path, iter_json_array(f_oracle), prints=iter_json_array(f_default))
+    manifest[card_db_path.name] = built_from
+    save_manifest(db_dir, manifest)
 
     # Log
-    print('JSON database created at:', card_json_file_path)
-    print('Number of cards:', len(cards_dict))
+    print('Card database created at:', card_db_path)
+    print('Number of cards:', n_cards)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
 import json
 from pathlib import Path
-import requests
+from mtg_toolbelt.database import scryfall as scryfall_api
 from mtg_toolbelt.utils import setup_dir
 
 
@@ -52,24 +52,17 @@ def scryfall(card_name):
     }
     """
     # Get list of all cards with a name: https://api.scryfall.com/cards/search?order=released&q=%2B%2B%21%22Rancor%22
-    query = f'++!"{card_name}"'
-    params = {
-        'order': 'released',
-        'unique': 'prints',
-        'q': query
-        }
-    r = requests.get('https://api.scryfall.com/cards/search', params=params)
-    reprints = r.json()
+    reprints = scryfall_api.get_client().search_prints(card_name, order='released')
 
     # Create return dict
     card = {
-        'name': reprints['data'][0]['name'],
+        'name': reprints[0]['name'],
         'best_price': {}
     }
 
     # Get prices of all reprints
     prices = []
-    for reprint in reprints['data']:
+    for reprint in reprints:
         reprint_prices = {
             'name': reprint['name'],
             'set_name': reprint['set_name'],
@@ -113,13 +106,9 @@ def get_prices():
     list
         List of card objects (dicts)
     """
-    response = requests.get('https://api.scryfall.com/bulk-data')
-    bulk_data = response.json()['data']
-    for item in bulk_data:
-        if item['type'] == 'default_cards':
-            response = requests.get(item['download_uri'])
-            data = response.json()
-            return data
+    client = scryfall_api.get_client()
+    bulk_data = client.bulk_data('default-cards')
+    return client.get_json(bulk_data['download_uri'])
 
 
 if __name__ == '__main__':
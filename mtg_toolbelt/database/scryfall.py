@@ -0,0 +1,127 @@
+"""
+Scryfall API client shared by the card database, deck data and price modules.
+
+All requests go through one pooled session with a token bucket rate limiter following Scryfall's guidance of
+at most 10 requests per second (see utils.RetrySession). Rate limited (429) and server error (5xx) responses,
+as well as connection errors, are retried. collection resolves up to 75 cards per request, and
+fetch_many runs many per-card searches concurrently while staying under the rate limit.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from mtg_toolbelt.utils import RetrySession
+
+
+# Scryfall API (can be pointed to a local server for testing)
+API_URL = 'https://api.scryfall.com'
+
+# Requests per second allowed by Scryfall
+RATE_LIMIT = 10
+
+# Maximum number of identifiers per /cards/collection request
+COLLECTION_SIZE = 75
+
+
+class ScryfallClient:
+    """
+    Rate limited Scryfall API client.
+
+    Usage
+    -------
+    client = ScryfallClient()
+    rancor_prints = client.search_prints('Rancor')
+    cards, not_found = client.collection(['Rancor', 'Forest'])
+    prints_by_name = client.fetch_many(['Rancor', 'Forest'])
+    """
+
+    def __init__(self, api_url=API_URL, rate=RATE_LIMIT, workers=8, max_retries=5, backoff=0.5, timeout=30):
+        self.api_url = api_url.rstrip('/')
+        self.workers = workers
+        self.session = RetrySession(rate, pool_size=workers, max_retries=max_retries, backoff=backoff,
+                                    timeout=timeout)
+
+    def url(self, path):
+        """Absolute URL of an API path (absolute URLs, e.g. next_page or download_uri, are kept as is)."""
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.api_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        """Rate limited request, retried on 429/5xx responses and connection errors (see RetrySession).
+        Returns the last response if all retries fail."""
+        return self.session.request(method, self.url(path), **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def get_json(self, path, **kwargs):
+        response = self.get(path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, path, **kwargs):
+        response = self.request('POST', path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def bulk_data(self, bulk_type='oracle-cards'):
+        """Metadata of a bulk data file (download_uri, updated_at, size, ...)."""
+        return self.get_json(f'bulk-data/{bulk_type}')
+
+    def search_prints(self, card_name, order='tix'):
+        """All prints of a card with an exact name, following result pages."""
+        params = {
+            'order': order,
+            'unique': 'prints',
+            'q': f'++!"{card_name}"'
+        }
+        page = self.get_json('cards/search', params=params)
+        prints = page['data']
+        while page.get('has_more'):
+            page = self.get_json(page['next_page'])
+            prints += page['data']
+        return prints
+
+    def collection(self, names):
+        """One card object (a single print) for each of many card names, requested through /cards/collection
+        in chunks of 75 names. Names may be the full name or the name of a face (e.g. 'Fire' for 'Fire // Ice').
+
+        RETURNS:
+            (dict, list)
+                Card objects by requested name, and the names which were not found.
+        """
+        names = list(dict.fromkeys(names))
+        found = {}
+        for i in range(0, len(names), COLLECTION_SIZE):
+            chunk = names[i:i + COLLECTION_SIZE]
+            response = self.post_json('cards/collection', json={'identifiers': [{'name': n} for n in chunk]})
+            by_name = {}
+            for card in response['data']:
+                by_name.setdefault(card['name'], card)
+                for face in card.get('card_faces', []):
+                    by_name.setdefault(face['name'], card)
+            found.update((name, by_name[name]) for name in chunk if name in by_name)
+        return found, [name for name in names if name not in found]
+
+    def fetch_many(self, names, order='tix'):
+        """All prints of many cards (see search_prints), requested concurrently. Returns a dictionary by
+        card name."""
+        names = list(dict.fromkeys(names))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(lambda name: self.search_prints(name, order=order), names)
+            return dict(zip(names, results))
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_url=API_URL):
+    """Shared client for an API URL, so all modules use the same session and rate limit."""
+    with _clients_lock:
+        if api_url not in _clients:
+            _clients[api_url] = ScryfallClient(api_url)
+        return _clients[api_url]
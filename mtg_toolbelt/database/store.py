@@ -0,0 +1,156 @@
+"""
+Indexed local card store (SQLite).
+
+Cards are stored as JSON, with indexed columns for the card name, front face name, oracle id and set, and
+a table of legalities by format. MTGO (tix) prices of every print of a card are stored in a prints table.
+Cards can be looked up without loading the whole database in memory.
+"""
+
+import json
+import os
+from pathlib import Path
+import sqlite3
+from typing import Dict, Iterable, List, Optional
+
+
+# Maximum number of parameters in a single SQLite query
+MAX_VARIABLES = 900
+
+SCHEMA = """
+CREATE TABLE cards (
+    name TEXT PRIMARY KEY,
+    front_name TEXT NOT NULL,
+    oracle_id TEXT,
+    set_code TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE legalities (
+    name TEXT NOT NULL,
+    format TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (name, format)
+);
+CREATE TABLE prints (
+    name TEXT NOT NULL,
+    set_code TEXT NOT NULL,
+    tix TEXT NOT NULL
+);
+CREATE INDEX idx_cards_front_name ON cards (front_name);
+CREATE INDEX idx_cards_oracle_id ON cards (oracle_id);
+CREATE INDEX idx_cards_set_code ON cards (set_code);
+CREATE INDEX idx_legalities_format_status ON legalities (format, status);
+CREATE INDEX idx_prints_name ON prints (name);
+"""
+
+
+def build(db_path: Path, cards: Iterable[Dict], prints: Iterable[Dict] = ()):
+    """Build a card store from an iterable of Scryfall card objects. Later cards replace earlier ones with
+    the same name. prints is an iterable of Scryfall card objects for every print of each card (e.g. the
+    default_cards bulk data), from which the MTGO prices are kept. The store is built in a temporary file
+    which then replaces db_path.
+
+    RETURNS:
+        int
+            Number of cards in the store.
+    """
+    tmp_path = db_path.with_name(db_path.name + '.tmp')
+    tmp_path.unlink(missing_ok=True)
+
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.executescript(SCHEMA)
+        for card in cards:
+            con.execute('INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?)', (
+                card['name'],
+                card['name'].split(' // ')[0],
+                card.get('oracle_id'),
+                card.get('set'),
+                json.dumps(card)
+            ))
+            con.execute('DELETE FROM legalities WHERE name = ?', (card['name'],))
+            con.executemany('INSERT INTO legalities VALUES (?, ?, ?)',
+                            [(card['name'], f, status) for f, status in card.get('legalities', {}).items()])
+        for card in prints:
+            tix = card.get('prices', {}).get('tix')
+            if tix:
+                con.execute('INSERT INTO prints VALUES (?, ?, ?)', (card['name'], card['set'].upper(), tix))
+        con.commit()
+        n_cards = con.execute('SELECT COUNT(*) FROM cards').fetchone()[0]
+    finally:
+        con.close()
+
+    os.replace(tmp_path, db_path)
+    return n_cards
+
+
+class CardStore:
+    """Read access to a card store built with `build`.
+
+    Example
+    -------
+    with CardStore(db_dir / 'cards.sqlite') as store:
+        rancor = store.get('Rancor')
+        cards = store.get_many(['Rancor', 'Forest'])
+        pauper_cards = store.legal_names('pauper')
+    """
+
+    def __init__(self, db_path: Path):
+        if not Path(db_path).exists():
+            raise FileNotFoundError(f'Card store not found: {db_path}. Run update-db first.')
+        self.con = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, check_same_thread=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Card with an exact name, or with that front face name (e.g. 'Fire' for 'Fire // Ice')."""
+        row = self.con.execute('SELECT data FROM cards WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            row = self.con.execute('SELECT data FROM cards WHERE front_name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, Dict]:
+        """Cards for many names at once. Returns a dictionary by the requested names; names not found are
+        left out."""
+        names = list(dict.fromkeys(names))
+        found = {}
+        for column in ['name', 'front_name']:
+            missing = [name for name in names if name not in found]
+            for i in range(0, len(missing), MAX_VARIABLES):
+                chunk = missing[i:i + MAX_VARIABLES]
+                query = f"SELECT {column}, data FROM cards WHERE {column} IN ({', '.join('?' * len(chunk))})"
+                for name, data in self.con.execute(query, chunk):
+                    found.setdefault(name, json.loads(data))
+        return found
+
+    def get_prices(self, names: Iterable[str]) -> Dict[str, List[List[str]]]:
+        """MTGO prices of all prints of many cards (by exact name), as lists of [set, tix]."""
+        names = list(dict.fromkeys(names))
+        prices = {name: [] for name in names}
+        for i in range(0, len(names), MAX_VARIABLES):
+            chunk = names[i:i + MAX_VARIABLES]
+            query = f"SELECT name, set_code, tix FROM prints WHERE name IN ({', '.join('?' * len(chunk))})"
+            for name, set_code, tix in self.con.execute(query, chunk):
+                prices[name].append([set_code, tix])
+        return prices
+
+    def get_by_oracle_id(self, oracle_id: str) -> Optional[Dict]:
+        row = self.con.execute('SELECT data FROM cards WHERE oracle_id = ?', (oracle_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def legal_names(self, format_: str, status: str = 'legal') -> List[str]:
+        """Names of all cards with a given legality status in a format, e.g. legal_names('pauper')."""
+        rows = self.con.execute('SELECT name FROM legalities WHERE format = ? AND status = ? ORDER BY name',
+                                (format_, status))
+        return [name for name, in rows]
+
+    def is_legal(self, name: str, format_: str) -> bool:
+        row = self.con.execute('SELECT status FROM legalities WHERE name = ? AND format = ?',
+                               (name, format_)).fetchone()
+        return row is not None and row[0] == 'legal'
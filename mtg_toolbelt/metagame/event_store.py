@@ -0,0 +1,131 @@
+"""
+Incremental store of MTGO standings events (SQLite).
+
+Each event page is stored by URL with the result of its last fetch: 'fetched' with the parsed decks and the
+ETag/Last-Modified headers of the page, or 'not_found'. Fetched events are final, except recent ones which
+are revalidated with a conditional request. Events not found are rechecked after a short TTL while they are
+recent, since standings are published some time after the event.
+"""
+
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+
+# Time after which a recent event which was not found is checked again, in seconds
+NOT_FOUND_TTL = 3600
+
+# Events up to this many days old may still be published or updated
+RECENT_DAYS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    decks JSON
+);
+"""
+
+
+def event_date(url):
+    """Date of an event from its URL (which ends with YYYY-MM-DD)."""
+    return datetime.strptime(url[-10:], '%Y-%m-%d')
+
+
+class EventStore:
+    """
+    Standings events by URL.
+
+    Usage
+    -------
+    with EventStore(metagame_path / 'events.sqlite') as store:
+        if store.needs_fetch(url):
+            ...
+            store.put(url, 'fetched', decks=[deck.to_dict() for deck in decks], etag=etag)
+        decks = store.get_decks(url)
+    """
+
+    def __init__(self, db_path: Path, not_found_ttl=NOT_FOUND_TTL, recent_days=RECENT_DAYS):
+        self.not_found_ttl = not_found_ttl
+        self.recent_days = recent_days
+        self.con = sqlite3.connect(db_path)
+        self.con.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.con.close()
+
+    def get(self, url) -> Optional[Dict]:
+        row = self.con.execute('SELECT status, checked_at, etag, last_modified, decks FROM events WHERE url = ?',
+                               (url,)).fetchone()
+        if row is None:
+            return None
+        status, checked_at, etag, last_modified, decks = row
+        return {'url': url, 'status': status, 'checked_at': checked_at, 'etag': etag,
+                'last_modified': last_modified, 'decks': json.loads(decks) if decks else []}
+
+    def get_state(self, url) -> Optional[Dict]:
+        """Entry of an event without its decks (see get), to check whether it has to be requested."""
+        row = self.con.execute('SELECT status, checked_at, etag, last_modified FROM events WHERE url = ?',
+                               (url,)).fetchone()
+        if row is None:
+            return None
+        status, checked_at, etag, last_modified = row
+        return {'url': url, 'status': status, 'checked_at': checked_at, 'etag': etag,
+                'last_modified': last_modified}
+
+    def get_decks(self, url) -> List[Dict]:
+        """Stored decks of an event (an empty list if it is not stored or was not found)."""
+        row = self.con.execute('SELECT decks FROM events WHERE url = ?', (url,)).fetchone()
+        return json.loads(row[0]) if row is not None and row[0] else []
+
+    def is_recent(self, url, now=None):
+        now = datetime.now() if now is None else now
+        return now - event_date(url) <= timedelta(days=self.recent_days)
+
+    def needs_fetch(self, url, entry=None) -> bool:
+        """Whether an event has to be requested: it was never fetched, or it is recent and either was not
+        found more than not_found_ttl seconds ago or may have been updated (see conditional_headers). entry is
+        the event's entry (get or get_state), read from the store if not given."""
+        if entry is None:
+            entry = self.get_state(url)
+        if entry is None:
+            return True
+        if not self.is_recent(url):
+            return False
+        if entry['status'] == 'not_found':
+            return time.time() - entry['checked_at'] > self.not_found_ttl
+        return True
+
+    @staticmethod
+    def conditional_headers(entry) -> Dict:
+        """Headers to revalidate a fetched event, so an unchanged page is answered with 304 Not Modified."""
+        headers = {}
+        if entry is not None and entry['status'] == 'fetched':
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, status, decks: List[Dict] = None, etag=None, last_modified=None):
+        self.con.execute('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)',
+                         (url, status, time.time(), etag, last_modified,
+                          json.dumps(decks) if decks is not None else None))
+        self.con.commit()
+
+    def touch(self, url):
+        """Mark an event as checked now (e.g. after a 304 Not Modified response)."""
+        self.con.execute('UPDATE events SET checked_at = ? WHERE url = ?', (time.time(), url))
+        self.con.commit()
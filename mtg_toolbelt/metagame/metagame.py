@@ -1,31 +1,88 @@
-from typing import List, Dict
+import heapq
+from typing import Dict, Iterable
 
 
-def get_card_counts(decks: List[Dict], board: str = 'mainboard', rank: str = 'total_count'):
+BOARDS = ['mainboard', 'sideboard']
+RANKS = ['total_count', 'unique_count']
+
+
+class CardCounts:
+    """
+    Card usage of a set of decks.
+
+    Decks are read in a single pass, so they can be a lazy iterable. Only the given boards are counted (e.g.
+    boards=['mainboard'] when the sideboard is not needed).
+
+    Usage
+    -------
+    counts = CardCounts(decks)
+    for card, count in counts.top('mainboard', 'unique_count', k=25):
+        print(card, count['total_count'], count['unique_count'], count['frequency'])
+    """
+
+    def __init__(self, decks: Iterable[Dict], boards: Iterable[str] = BOARDS):
+        boards = list(dict.fromkeys(boards))
+        for board in boards:
+            if board not in BOARDS:
+                raise ValueError('board must be either mainboard or sideboard.')
+
+        # [total_count, unique_count, last deck] of each card, in order of first appearance in each board
+        self.counts = {board: {} for board in boards}
+        board_counts = list(self.counts.items())
+        n_decks = 0
+        for deck in decks:
+            n_decks += 1
+            for board, card_counts in board_counts:
+                for quantity, name in deck.get(board) or ():
+                    card = card_counts.get(name)
+                    if card is None:
+                        card_counts[name] = [quantity, 1, n_decks]
+                    else:
+                        card[0] += quantity
+                        if card[2] != n_decks:  # a card listed twice in a deck counts once
+                            card[1] += 1
+                            card[2] = n_decks
+        self.n_decks = n_decks
+
+    def top(self, board: str = 'mainboard', rank: str = 'total_count', k: int = None):
+        """The k cards (all cards if k is None, none if k <= 0) of a board with the highest rank, as a list of
+        (card name, {'total_count', 'unique_count', 'frequency'}). Ties keep the order of first appearance in
+        the board."""
+        if board not in BOARDS:
+            raise ValueError('board must be either mainboard or sideboard.')
+        if rank not in RANKS:
+            raise ValueError('rank must be either total_count or unique_count')
+        if board not in self.counts:
+            raise ValueError(f'{board} was not counted (see boards).')
+        if k is not None and k <= 0:
+            return []
+
+        column = RANKS.index(rank)
+        cards = self.counts[board].items()
+        if k is None:
+            ranked = sorted(cards, key=lambda item: item[1][column], reverse=True)
+        else:
+            ranked = heapq.nlargest(k, cards, key=lambda item: item[1][column])
+
+        return [(name, {'total_count': total_count, 'unique_count': unique_count,
+                        'frequency': unique_count / self.n_decks})
+                for name, (total_count, unique_count, _) in ranked]
+
+
+def get_card_counts(decks: Iterable[Dict], board: str = 'mainboard', rank: str = 'total_count', top: int = None):
     """Given a list of Deck objects, get card frequencies.
     total_count gives the total number of times a card appears in all decks.
     unique_count gives the number of decks in which the card appeared.
+    Returns a dictionary sorted by rank, with only the top cards if top is given (see CardCounts).
     """
-    if board not in ['mainboard', 'sideboard']:
+    if board not in BOARDS:
         raise ValueError('board must be either mainboard or sideboard.')
-    if rank not in ['total_count', 'unique_count']:
+    if rank not in RANKS:
         raise ValueError('rank must be either total_count or unique_count')
 
-    card_freq = dict()
-    for deck in decks:
-        for card in deck[board]:
-            if card[1] in card_freq:
-                card_freq[card[1]]['total_count'] += card[0]
-                card_freq[card[1]]['unique_count'] += 1
-            else:
-                card_freq[card[1]] = {
-                    'total_count': card[0],
-                    'unique_count': 1,
-                }
-
-    sorted_card_freq = {k: v for k, v in sorted(card_freq.items(), key=lambda item: item[1][rank], reverse=True)}
-
-    return sorted_card_freq
+    card_counts = CardCounts(decks, boards=[board])
+    return {card: {'total_count': count['total_count'], 'unique_count': count['unique_count']}
+            for card, count in card_counts.top(board, rank, k=top)}
 
 
 if __name__ == '__main__':
@@ -1,101 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import json
 from typing import List
-from bs4 import BeautifulSoup
 from pathlib import Path
-import requests
 from tqdm import tqdm
+from mtg_toolbelt.metagame.event_store import EventStore
+from mtg_toolbelt.metagame.standings_parser import parse_decklists
 from mtg_toolbelt.models import Deck
+from mtg_toolbelt.utils import RetrySession
 
 
-def scrape_decklists(start_date_str, end_date_str, format_, metagame_path):
+# MTGO standings pages (can be pointed to a local server for testing)
+STANDINGS_URL = 'https://magic.wizards.com/en/articles/archive/mtgo-standings/'
+
+# Requests per second allowed to each host
+HOST_RATE_LIMIT = 10
+
+# Standings stream (JSON Lines)
+STREAM_FILE = 'standings.jsonl'
+
+
+class PageFetcher:
+    """
+    Concurrent page fetcher, with a pooled session shared by a bounded pool of workers, a rate limit per host
+    and retries on 429/5xx responses and connection errors (see RetrySession).
+
+    Usage
+    -------
+    fetcher = PageFetcher(workers=8)
+    for url, response in fetcher.fetch_all(urls):
+        ...
+    """
+
+    def __init__(self, workers=8, rate=HOST_RATE_LIMIT, max_retries=3, backoff=0.5, timeout=30):
+        self.workers = workers
+        self.session = RetrySession(rate, pool_size=workers, per_host=True, max_retries=max_retries,
+                                    backoff=backoff, timeout=timeout)
+
+    def fetch(self, url, headers=None):
+        """GET a page, retrying 429/5xx responses and connection errors. Returns the last response."""
+        return self.session.get(url, headers=headers)
+
+    def fetch_all(self, urls, headers=None):
+        """Fetch pages concurrently, yielding (url, response) as soon as each page arrives, so the caller can
+        parse pages while the next ones are downloaded. headers optionally gives request headers by URL."""
+        headers = headers or {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.fetch, url, headers.get(url)): url for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def close(self):
+        self.session.close()
+
+
+def event_urls(start_date, end_date, format_, standings_url=STANDINGS_URL):
+    """
+    URLs of each possible league/challenge event of a format for each day between two dates.
+    """
+    delta = timedelta(days=1)
+    requests_list = []
+    while start_date <= end_date:
+        requests_list.append(standings_url + format_ + '-league-' + start_date.strftime('%Y-%m-%d'))
+        requests_list.append(standings_url + format_ + '-challenge-' + start_date.strftime('%Y-%m-%d'))
+        start_date += delta
+    return requests_list
+
+
+def completed_events(stream_path: Path, header):
+    """
+    URLs of the events already written to a standings stream with the same header, for resuming it. A partial
+    last line (from an interrupted run) is removed. Returns None if there is no stream for this header.
+    """
+    try:
+        f = open(stream_path, 'r+b')
+    except FileNotFoundError:
+        return None
+    with f:
+        header_line = f.readline()
+        try:
+            if json.loads(header_line) != header:
+                return None
+        except json.JSONDecodeError:
+            return None
+
+        # Read one event at a time, up to the first partial line
+        done = set()
+        good_size = len(header_line)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(json.loads(line)['event'])
+            except json.JSONDecodeError:
+                break
+            good_size += len(line)
+        f.truncate(good_size)
+    return done
+
+
+def read_stream(stream_path: Path):
+    """
+    Lazily read a standings stream (JSON Lines): returns the header (format, start_date, end_date) and an
+    iterator over the decks (dictionaries as in standings.json), reading one event at a time.
+    """
+    with open(stream_path, 'r') as f:
+        header = json.loads(f.readline())
+
+    def iter_decks():
+        with open(stream_path, 'r') as f:
+            f.readline()
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:  # partial line from an interrupted run
+                    break
+                yield from event['decks']
+
+    return header, iter_decks()
+
+
+def load_standings(metagame_path: Path):
+    """
+    Standings of the last standings run, from standings.json or the standings.jsonl stream (whichever is the
+    most recent). Returns the standings info (format, start_date, end_date) and an iterable over the decks.
+    """
+    json_path = metagame_path / 'standings.json'
+    stream_path = metagame_path / STREAM_FILE
+    if stream_path.exists() and (not json_path.exists() or stream_path.stat().st_mtime > json_path.stat().st_mtime):
+        return read_stream(stream_path)
+
+    with open(json_path, 'r') as f:
+        standings_dict = json.load(f)
+    decks = standings_dict.pop('decks')
+    return standings_dict, decks
+
+
+def update_events(requests_list, event_store: EventStore, workers=8, parser=None):
+    """
+    Request the events of requests_list which are not stored yet or may have changed (see
+    EventStore.needs_fetch) and store them. Pages are fetched concurrently by a pool of workers (see
+    PageFetcher) and parsed as they arrive, with the given parser backend (see standings_parser).
+
+    Other responses are not stored, so these events are requested again on the next run.
+
+    Yields (url, decks) for every stored event with standings, first the events which are not requested, then
+    the requested ones as they are parsed. decks is the list of deck dictionaries of a parsed page, or None if
+    the stored decks are unchanged (read them with event_store.get_decks), so stored decks are only loaded when
+    needed.
+    """
+    # Only request events not seen yet, recent events not found and recent events which may have changed
+    states = {website: event_store.get_state(website) for website in requests_list}
+    to_fetch = [website for website in requests_list if event_store.needs_fetch(website, states[website])]
+    headers = {website: EventStore.conditional_headers(states[website]) for website in to_fetch}
+
+    to_fetch_set = set(to_fetch)
+    for website in requests_list:
+        if website not in to_fetch_set and states[website]['status'] == 'fetched':
+            yield website, None
+
+    # Fetch each URL concurrently, parsing pages while the next ones are downloaded
+    fetcher = PageFetcher(workers=workers)
+    try:
+        for website, response in tqdm(fetcher.fetch_all(to_fetch, headers=headers), total=len(to_fetch)):
+            if response.status_code == 200:
+                event_decks = [deck.to_dict() for deck in parse_decklists(response.content, website, parser=parser)]
+                event_store.put(website, 'fetched', decks=event_decks, etag=response.headers.get('ETag'),
+                                last_modified=response.headers.get('Last-Modified'))
+                yield website, event_decks
+            elif response.status_code == 304:
+                event_store.touch(website)
+                yield website, None
+            elif response.status_code == 404:
+                event_store.put(website, 'not_found')
+            elif states[website] is not None and states[website]['status'] == 'fetched':
+                # Failed revalidation: keep the stored decks, the event is requested again on the next run
+                yield website, None
+    finally:
+        fetcher.close()
+    print(f"Requested {len(to_fetch)} of {len(requests_list)} events, the others were already stored.")
+
+
+def scrape_decklists(start_date_str, end_date_str, format_, metagame_path, workers=8,
+                     standings_url=STANDINGS_URL, parser=None) -> List[Deck]:
     """
     Program which allows retrieval of decks from any format from MTGO, using a set start and end date in a
     YYYY-MM-DD format and a format_ (standard, modern, legacy, pauper, pioneer, vintage).
+
+    Events are kept in metagame_path/events.sqlite (see EventStore), so events seen by previous runs are not
+    requested again, apart from recent ones (see update_events). All decks are saved to standings.json and
+    returned.
     """
     # Convert start and end dates into Date objects, as well as assign interval for checking
     start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
     end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
     meta_delta = end_date - start_date
-    delta = timedelta(days=1)
 
     # Create a request list with each possible instance leagues/challenges of the chosen format for each day
-    requests_list = []
-    while start_date <= end_date:
-        requests_list.append(
-            'https://magic.wizards.com/en/articles/archive/mtgo-standings/' + format_ + '-league-' + start_date.strftime('%Y-%m-%d'))
-        requests_list.append(
-            'https://magic.wizards.com/en/articles/archive/mtgo-standings/' + format_ + '-challenge-' + start_date.strftime('%Y-%m-%d'))
-        start_date += delta
+    requests_list = event_urls(start_date, end_date, format_, standings_url=standings_url)
 
-    # Iterate through each possible URL
-    decks = []
-    for website in tqdm(requests_list):
-        # Request each URL, translate into a parsable format, and filter all individual instances of decklists.
-        mtg_page = requests.get(website)
-        mtg_soup = BeautifulSoup(mtg_page.content, "html.parser")
-        deck_divs = mtg_soup.find_all('div', class_='deck-group')
-
-        if deck_divs:
-            # For each deck div
-            for deck_div in deck_divs:
-                mainboard_div = deck_div.find_all('div', class_='sorted-by-overview-container sortedContainer')[0]
-                sideboard_div = deck_div.find_all('div', class_='sorted-by-sideboard-container clearfix element')[0]
-                author = deck_div.find('span', class_='deck-meta').h4.text
-                source = website
-
-                # Mainboard
-                card_counts = []
-                card_names = []
-                # For each card count and name
-                for ccount in mainboard_div.find_all('span', class_='card-count'):
-                    card_counts.append(int(ccount.contents[0]))
-                for cname in mainboard_div.find_all('a', class_='deck-list-link'):
-                    card_names.append(cname.contents[0])
-
-                mainboard = []
-                for card_qty, card_name in zip(card_counts, card_names):
-                    mainboard.append(
-                        (card_qty, card_name)
-                    )
-
-                # Sideboard
-                card_counts = []
-                card_names = []
-                # For each card count and name
-                for ccount in sideboard_div.find_all('span', class_='card-count'):
-                    card_counts.append(int(ccount.contents[0]))
-                for cname in sideboard_div.find_all('a', class_='deck-list-link'):
-                    card_names.append(cname.contents[0])
-
-                sideboard = []
-                for card_qty, card_name in zip(card_counts, card_names):
-                    sideboard.append(
-                        (card_qty, card_name)
-                    )
-
-                # Create deck instance
-                d = Deck(
-                    mainboard=mainboard,
-                    sideboard=sideboard,
-                    author=author,
-                    source=source
-                )
-                decks.append(d)
+    with EventStore(metagame_path / 'events.sqlite') as event_store:
+        for _ in update_events(requests_list, event_store, workers=workers, parser=parser):
+            pass
+        decks = []
+        for website in requests_list:
+            decks += [Deck.from_dict(deck_dict) for deck_dict in event_store.get_decks(website)]
 
     # Save standings
+    deck_dict = []
+    for deck in decks:
+        deck_dict.append(deck.to_dict())
     standings_dict = {
         'format': format_,
         'start_date': start_date_str,
         'end_date': end_date_str,
+        'decks': deck_dict,
+        'n_decks': len(deck_dict),
     }
 
-    deck_dict = []
-    for deck in decks:
-        deck_dict.append(deck.to_dict())
-    standings_dict['decks'] = deck_dict
-    standings_dict['n_decks'] = len(deck_dict)
-
     standings_path = metagame_path / 'standings.json'
     with open(standings_path, 'w') as f:
         json.dump(standings_dict, f)
@@ -108,6 +230,51 @@ def scrape_decklists(start_date_str, end_date_str, format_, metagame_path):
     return decks
 
 
+def stream_decklists(start_date_str, end_date_str, format_, metagame_path, workers=8,
+                     standings_url=STANDINGS_URL, parser=None) -> int:
+    """
+    Same as scrape_decklists, but the decks of each event are appended to standings.jsonl (a header line, then
+    one line per event) as soon as the event is parsed, or read from the event store, so at most one event is
+    held in memory. An interrupted stream with the same dates and format is resumed from the last completed
+    event. Returns the number of decks written (read them with read_stream).
+    """
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+    meta_delta = end_date - start_date
+    header = {
+        'format': format_,
+        'start_date': start_date_str,
+        'end_date': end_date_str,
+    }
+    requests_list = event_urls(start_date, end_date, format_, standings_url=standings_url)
+
+    # Resume stream
+    stream_path = metagame_path / STREAM_FILE
+    done = completed_events(stream_path, header)
+    if done is None:
+        stream_file = open(stream_path, 'w')
+        stream_file.write(json.dumps(header) + '\n')
+        done = set()
+    else:
+        stream_file = open(stream_path, 'a')
+        print(f"Resuming {stream_path} ({len(done)} events already written).")
+    requests_list = [website for website in requests_list if website not in done]
+
+    n_streamed = 0
+    with stream_file, EventStore(metagame_path / 'events.sqlite') as event_store:
+        for website, event_decks in update_events(requests_list, event_store, workers=workers, parser=parser):
+            if event_decks is None:
+                event_decks = event_store.get_decks(website)
+            stream_file.write(json.dumps({'event': website, 'decks': event_decks}) + '\n')
+            stream_file.flush()
+            n_streamed += len(event_decks)
+
+    print(f"{format_.upper()} format standings.")
+    print(f"Wrote {n_streamed} decks in the period {start_date_str} - {end_date_str} ({meta_delta.days} days).")
+    print(f"Standings stream saved to {str(stream_path)}.")
+    return n_streamed
+
+
 if __name__ == '__main__':
     standings_path_ = Path('../../data/metagame')
     res = scrape_decklists('2022-07-25', '2022-08-03', 'pauper', standings_path_)
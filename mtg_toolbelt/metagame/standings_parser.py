@@ -0,0 +1,205 @@
+"""
+Parser backends for MTGO standings pages.
+
+All backends extract the same decks (see parse_decklists) from a page:
+    - bs4: BeautifulSoup with Python's html.parser (reference implementation, always available).
+    - lxml: lxml.html, a C parser. Each board is scanned once for card counts and names.
+    - selectolax: selectolax's lexbor HTML parser (optional, pip install selectolax).
+
+tests/test_standings_parser.py checks every installed backend against saved pages with their expected decks
+(tests/standings_pages). Run as a script to check that every available backend gives identical decks to bs4 on
+other saved standings pages, and to time each backend:
+
+    python -m mtg_toolbelt.metagame.standings_parser page1.html page2.html ...
+"""
+
+import sys
+import time
+from typing import List
+from bs4 import BeautifulSoup, UnicodeDammit
+from mtg_toolbelt.models import Deck
+
+
+MAINBOARD_CLASS = 'sorted-by-overview-container sortedContainer'
+SIDEBOARD_CLASS = 'sorted-by-sideboard-container clearfix element'
+
+
+def _make_deck(mainboard_counts, mainboard_names, sideboard_counts, sideboard_names, author, source):
+    return Deck(
+        mainboard=list(zip(mainboard_counts, mainboard_names)),
+        sideboard=list(zip(sideboard_counts, sideboard_names)),
+        author=author,
+        source=source
+    )
+
+
+def parse_bs4(content, source) -> List[Deck]:
+    # Translate page into a parsable format, and filter all individual instances of decklists.
+    mtg_soup = BeautifulSoup(content, "html.parser")
+    deck_divs = mtg_soup.find_all('div', class_='deck-group')
+
+    decks = []
+    for deck_div in deck_divs:
+        mainboard_div = deck_div.find_all('div', class_=MAINBOARD_CLASS)[0]
+        sideboard_div = deck_div.find_all('div', class_=SIDEBOARD_CLASS)[0]
+        author = deck_div.find('span', class_='deck-meta').h4.text
+
+        boards = []
+        for board_div in [mainboard_div, sideboard_div]:
+            card_counts = [int(ccount.contents[0]) for ccount in board_div.find_all('span', class_='card-count')]
+            card_names = [cname.contents[0] for cname in board_div.find_all('a', class_='deck-list-link')]
+            boards += [card_counts, card_names]
+
+        decks.append(_make_deck(*boards, author, source))
+    return decks
+
+
+def _has_class(element, class_name):
+    return class_name in element.get('class', '').split()
+
+
+def parse_lxml(content, source) -> List[Deck]:
+    from lxml import etree, html
+
+    # Decode like BeautifulSoup does, so card names are identical
+    if isinstance(content, bytes):
+        content = UnicodeDammit(content, is_html=True).unicode_markup
+    # lxml refuses documents without elements (empty, whitespace or comments only), which have no decks
+    try:
+        root = html.fromstring(content)
+    except etree.ParserError:
+        return []
+
+    decks = []
+    for deck_div in root.iter('div'):
+        if not _has_class(deck_div, 'deck-group'):
+            continue
+        mainboard_div = sideboard_div = author_span = None
+        for element in deck_div.iter('div', 'span'):
+            class_attr = element.get('class')
+            if element.tag == 'div':
+                if mainboard_div is None and class_attr == MAINBOARD_CLASS:
+                    mainboard_div = element
+                elif sideboard_div is None and class_attr == SIDEBOARD_CLASS:
+                    sideboard_div = element
+            elif author_span is None and class_attr and 'deck-meta' in class_attr.split():
+                author_span = element
+        author = next(author_span.iter('h4')).text_content()
+
+        # Single pass over each board for both card counts and card names
+        boards = []
+        for board_div in [mainboard_div, sideboard_div]:
+            card_counts = []
+            card_names = []
+            for element in board_div.iter('span', 'a'):
+                if element.tag == 'span':
+                    if _has_class(element, 'card-count'):
+                        card_counts.append(int(element.text))
+                elif _has_class(element, 'deck-list-link'):
+                    card_names.append(element.text)
+            boards += [card_counts, card_names]
+
+        decks.append(_make_deck(*boards, author, source))
+    return decks
+
+
+def parse_selectolax(content, source) -> List[Deck]:
+    try:
+        from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    except ImportError:  # older selectolax without the lexbor backend
+        from selectolax.parser import HTMLParser
+
+    if isinstance(content, bytes):
+        content = UnicodeDammit(content, is_html=True).unicode_markup
+    tree = HTMLParser(content)
+
+    decks = []
+    for deck_div in tree.css('div.deck-group'):
+        mainboard_div = deck_div.css_first(f'div[class="{MAINBOARD_CLASS}"]')
+        sideboard_div = deck_div.css_first(f'div[class="{SIDEBOARD_CLASS}"]')
+        author = deck_div.css_first('span.deck-meta h4').text()
+
+        # Single query per board for both card counts and card names
+        boards = []
+        for board_div in [mainboard_div, sideboard_div]:
+            card_counts = []
+            card_names = []
+            for node in board_div.css('span.card-count, a.deck-list-link'):
+                if node.tag == 'span':
+                    card_counts.append(int(node.text(deep=False)))
+                else:
+                    card_names.append(node.text(deep=False))
+            boards += [card_counts, card_names]
+
+        decks.append(_make_deck(*boards, author, source))
+    return decks
+
+
+PARSERS = {
+    'bs4': parse_bs4,
+    'lxml': parse_lxml,
+    'selectolax': parse_selectolax,
+}
+
+
+def available_parsers():
+    """Names of the parser backends whose library is installed."""
+    available = ['bs4']
+    for name in ['lxml', 'selectolax']:
+        try:
+            __import__(name)
+            available.append(name)
+        except ImportError:
+            pass
+    return available
+
+
+def default_parser():
+    """lxml if it is installed, otherwise bs4. selectolax is only used when it is chosen explicitly, since it is
+    not covered by the golden page tests (tests/test_standings_parser.py) unless it is installed."""
+    return 'lxml' if 'lxml' in available_parsers() else 'bs4'
+
+
+def parse_decklists(content, source, parser=None) -> List[Deck]:
+    """
+    Parse all decklists of a standings page with a parser backend (see PARSERS and default_parser).
+    """
+    if parser is None:
+        parser = default_parser()
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown parser '{parser}', choose one of: {', '.join(PARSERS)}.")
+    return PARSERS[parser](content, source)
+
+
+def check_and_benchmark(page_paths, repeat=5):
+    """
+    Check that every available backend gives identical decks to bs4 on saved pages, then time each backend.
+    """
+    pages = []
+    for page_path in page_paths:
+        with open(page_path, 'rb') as f:
+            pages.append((f.read(), str(page_path)))
+
+    # Golden check: same decks as the reference implementation
+    parsers = available_parsers()
+    for content, source in pages:
+        golden = [deck.to_dict() for deck in parse_bs4(content, source)]
+        for parser in parsers:
+            decks = [deck.to_dict() for deck in parse_decklists(content, source, parser=parser)]
+            assert decks == golden, f'{parser} decks differ from bs4 on {source}'
+    print(f'{len(pages)} pages: {", ".join(parsers)} give identical decks.')
+
+    # Micro-benchmark
+    timings = {}
+    for parser in parsers:
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            for content, source in pages:
+                parse_decklists(content, source, parser=parser)
+        timings[parser] = (time.perf_counter() - start_time) / repeat / len(pages)
+    for parser, timing in timings.items():
+        print(f'{parser:<10} {timing * 1000:8.2f} ms per page ({timings["bs4"] / timing:.1f}x)')
+
+
+if __name__ == '__main__':
+    check_and_benchmark(sys.argv[1:])
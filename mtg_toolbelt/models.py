@@ -22,6 +22,19 @@ class Deck:
         # return asdict(self)
         return self.__dict__
 
+    @classmethod
+    def from_dict(cls, deck_dict):
+        """Deck from a dictionary created by to_dict (e.g. loaded from JSON), keeping its creation date."""
+        deck_dict = dict(deck_dict)
+        created_at = deck_dict.pop('created_at', None)
+        deck_dict['mainboard'] = [tuple(c) for c in deck_dict['mainboard']]
+        if deck_dict.get('sideboard') is not None:
+            deck_dict['sideboard'] = [tuple(c) for c in deck_dict['sideboard']]
+        deck = cls(**deck_dict)
+        if created_at is not None:
+            deck.created_at = created_at
+        return deck
+
     def to_txt(self, location):
         # filename = f"{location}/Deck-{self.name.replace(' ', '-')}.txt"
         filename = Path(location) / f"Deck-{self.name.replace(' ', '-')}.txt"
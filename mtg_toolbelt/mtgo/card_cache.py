@@ -0,0 +1,113 @@
+"""
+Persistent cache of card info (see deck_data.get_card_data) across update-decks runs.
+
+Entries are appended to a JSON Lines file as soon as they are stored, so a crash never loses more than the
+entry being written. Static card data (cmc, type, mana cost, ...) and volatile prices have separate time to
+live: an entry is stale as soon as either part is older than its TTL. The file is compacted on close.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+
+# Time to live of static card data and of prices, in seconds
+STATIC_TTL = 30 * 24 * 3600
+PRICE_TTL = 24 * 3600
+
+
+class CardCache:
+    """
+    Card info cache backed by a JSON Lines file.
+
+    Usage
+    -------
+    with CardCache(decks_path / 'card-cache.jsonl') as cache:
+        info = cache.get('Rancor')  # None if missing or stale
+        if info is None:
+            cache.put(deck_data.get_card_data('Rancor'))
+        print(cache.stats())
+    """
+
+    def __init__(self, path: Path, static_ttl=STATIC_TTL, price_ttl=PRICE_TTL):
+        self.path = Path(path)
+        self.static_ttl = static_ttl
+        self.price_ttl = price_ttl
+        self.entries = self._load()
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load(self):
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # partial line from an interrupted run
+                        continue
+                    entries[entry['info']['name']] = entry
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def get(self, name):
+        """Card info for a card name, or None if the card is not cached or its entry is stale."""
+        entry = self.entries.get(name)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if now - entry['static_time'] > self.static_ttl or now - entry['price_time'] > self.price_ttl:
+            self.stale += 1
+            return None
+
+        self.hits += 1
+        return entry['info']
+
+    def put(self, card_info):
+        """Store fresh card info and append it to the cache file."""
+        now = time.time()
+        entry = {'info': card_info, 'static_time': now, 'price_time': now}
+        self.entries[card_info['name']] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+
+    def update_prices(self, name, prices, best_price):
+        """Store fresh prices of a cached card, keeping its static data (and its age). Returns False if the
+        card is not cached."""
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+        entry = {'info': {**entry['info'], 'prices': prices, 'best_price': best_price},
+                 'static_time': entry['static_time'], 'price_time': time.time()}
+        self.entries[name] = entry
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        return True
+
+    def stats(self):
+        lookups = self.hits + self.stale + self.misses
+        return {'hits': self.hits, 'stale': self.stale, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        """Close the cache file, rewriting it with only the latest entry of each card."""
+        if self._file.closed:
+            return
+        self._file.close()
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, self.path)
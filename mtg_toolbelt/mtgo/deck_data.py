@@ -2,34 +2,45 @@ import os
 import json
 import time
 import datetime
+import hashlib
 import logging
-import requests
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from tqdm import tqdm
 from pathlib import Path
+from mtg_toolbelt.database import scryfall
+from mtg_toolbelt.database.store import CardStore
+from mtg_toolbelt.mtgo import deck_files
+from mtg_toolbelt.mtgo.card_cache import CardCache, STATIC_TTL, PRICE_TTL
 from mtg_toolbelt.utils import COLORS, FAMILIES
 
 
 # Dictionary to store card info
 CARD_INFO_DICT = {}
 
+# Finds the family names in a deck name. The lookahead reports a match at every position, where the
+# alternation picks the first family of FAMILIES starting there.
+FAMILY_PATTERN = re.compile('(?=({}))'.format('|'.join(re.escape(family) for family in FAMILIES)))
+FAMILY_ORDER = {family: i for i, family in enumerate(FAMILIES)}
 
-def search_deck(name, deck_list):
+
+def index_decks(deck_list):
     """
-    Given a deck name, return the deck info dictionary if it exist in a given list of deck dictionaries.
+    Given a list of deck dictionaries, return a dictionary of decks by name for constant time lookups.
     """
-    for d in deck_list:
-        if d['name'] == name:
-            return d
-    return None
+    return {d['name']: d for d in deck_list}
 
 
 def find_family(deck_name):
     """
-    Given a deck name, try to find the deck family.
+    Given a deck name, try to find the deck family (the first of FAMILIES contained in the name).
     """
-    for family in FAMILIES:
-        if family in deck_name.lower():
-            return family
+    families = [match.group(1) for match in FAMILY_PATTERN.finditer(deck_name.lower())]
+    if families:
+        return min(families, key=FAMILY_ORDER.get)
 
 
 def create_json(decks_path=None):
@@ -44,16 +55,16 @@ def create_json(decks_path=None):
     old_decks_json = Path(decks_path, 'decks.json')
     if old_decks_json.exists():
         with open(old_decks_json, 'r') as f:
-            decks_old = json.load(f)
+            decks_old = index_decks(json.load(f))
 
     # Get new decks
     valid_decks_path = decks_path / 'valid'
-    deck_files = [f for f in valid_decks_path.iterdir() if f.is_file() and str(f).endswith('.txt')]
+    with os.scandir(valid_decks_path) as entries:
+        deck_names = [entry.name[:-len('.txt')] for entry in entries if entry.is_file() and entry.name.endswith('.txt')]
 
     # Create new deck data
     deck_info = []
-    for deck_file in deck_files:
-        deck_name = deck_file.stem
+    for deck_name in deck_names:
 
         # Create deck entry
         info = {
@@ -65,7 +76,7 @@ def create_json(decks_path=None):
 
         if old_decks_json.exists():
             # Check for deck info in previous json deck info file
-            prev_deck_info = search_deck(deck_name, decks_old)
+            prev_deck_info = decks_old.get(deck_name)
 
             if prev_deck_info:
                 # Update new deck dictionary with previous info
@@ -97,7 +108,7 @@ def create_json(decks_path=None):
     new_decks_json.rename(decks_path / 'decks.json')
 
 
-def get_card_data(card_name):
+def get_card_data(card_name, reprints=None):
     """
     Get relevant card info from Scyfall API.
 
@@ -105,6 +116,8 @@ def get_card_data(card_name):
     ----------
     card_name : str
         Name of card to search.
+    reprints : list, optional
+        Scryfall card objects of all prints of the card, if already requested (see ScryfallClient.fetch_many).
 
     Returns
     -------
@@ -139,47 +152,46 @@ def get_card_data(card_name):
     """
 
     # Get list of all cards with a name: https://api.scryfall.com/cards/search?order=released&q=%2B%2B%21%22Rancor%22
-    query = '++!"{}"'.format(card_name)
-    params = {
-        'order': 'tix',
-        'unique': 'prints',
-        'q': query
-    }
-    r = requests.get('https://api.scryfall.com/cards/search', params=params)
-    reprint_dict = r.json()
+    if reprints is None:
+        reprints = scryfall.get_client().search_prints(card_name, order='tix')
+
+    # Get prices of all reprints available on MTGO
+    prices = [[reprint['set'].upper(), reprint['prices']['tix']]
+              for reprint in reprints if reprint['prices']['tix']]
 
+    return card_info_from_scryfall(card_name, reprints[-1], prices)
+
+
+def card_info_from_scryfall(card_name, card, prices):
+    """
+    Create the card info dictionary (see get_card_data) from a Scryfall card object and the MTGO prices of
+    its prints, as a list of [set, tix].
+    """
     # Create return dict
     card_info = {'name': card_name,
-                 'prices': [],
+                 'prices': prices,
                  'best_price': None}
 
-    # Get prices of all reprints
-    for reprint in reprint_dict['data']:
-        # Only do stuff for reprints available on MTGO
-        if reprint['prices']['tix']:
-            card_info['prices'].append([reprint['set'].upper(), reprint['prices']['tix']])
-
     if card_info['prices']:
-        # card_info['best_price'] = str(min([float(set_price[1]) for set_price in card_info['prices']]))
         card_info['best_price'] = min(card_info['prices'], key=lambda x: float(x[1]))
     else:
         print(f'\nWARNING: No price found for {card_info["name"]}')
 
     # Get card data
-    card_info['scryfall_uri'] = reprint_dict['data'][-1]['scryfall_uri']
-    card_info['cmc'] = reprint_dict['data'][-1]['cmc']
-    card_info['legalities'] = reprint_dict['data'][-1]['legalities']
+    card_info['scryfall_uri'] = card['scryfall_uri']
+    card_info['cmc'] = card['cmc']
+    card_info['legalities'] = card['legalities']
     try:
-        card_info['image_uris'] = reprint_dict['data'][-1]['image_uris']
-        card_info['mana_cost'] = reprint_dict['data'][-1]['mana_cost']
-        card_info['colors'] = reprint_dict['data'][-1]['colors']
-        card_info['type'] = reprint_dict['data'][-1]['type_line']
+        card_info['image_uris'] = card['image_uris']
+        card_info['mana_cost'] = card['mana_cost']
+        card_info['colors'] = card['colors']
+        card_info['type'] = card['type_line']
     except KeyError:  # handles card with multiple faces
-        card_info['image_uris'] = reprint_dict['data'][-1]['card_faces'][0]['image_uris']
-        card_info['image_uris_2'] = reprint_dict['data'][-1]['card_faces'][1]['image_uris']
-        card_info['mana_cost'] = reprint_dict['data'][-1]['card_faces'][0]['mana_cost']
-        card_info['colors'] = reprint_dict['data'][-1]['card_faces'][0]['colors']
-        card_info['type'] = reprint_dict['data'][-1]['card_faces'][0]['type_line']
+        card_info['image_uris'] = card['card_faces'][0]['image_uris']
+        card_info['image_uris_2'] = card['card_faces'][1]['image_uris']
+        card_info['mana_cost'] = card['card_faces'][0]['mana_cost']
+        card_info['colors'] = card['card_faces'][0]['colors']
+        card_info['type'] = card['card_faces'][0]['type_line']
 
     if 'Land' in card_info['type']:
         card_info['is_land'] = True
@@ -189,6 +201,90 @@ def get_card_data(card_name):
     return card_info
 
 
+def fetch_card_info(card_names, client: scryfall.ScryfallClient = None):
+    """
+    Get relevant card info (see get_card_data) for many cards from the Scryfall API. Cards are requested in
+    batches of 75 through /cards/collection, which returns a single print of each card. All prints are only
+    searched for cards where that print is a reprint, since the best price may come from another print.
+    """
+    if client is None:
+        client = scryfall.get_client()
+
+    cards, not_found = client.collection(card_names)
+    if not_found:
+        raise LookupError(f"Cards not found on Scryfall: {', '.join(not_found)}")
+
+    multi_print = [name for name, card in cards.items() if card.get('reprint')]
+    reprints_by_name = client.fetch_many(multi_print, order='tix')
+
+    card_infos = []
+    for name, card in cards.items():
+        if name in reprints_by_name:
+            card_infos.append(get_card_data(name, reprints=reprints_by_name[name]))
+        else:
+            prices = [[card['set'].upper(), card['prices']['tix']]] if card['prices']['tix'] else []
+            card_infos.append(card_info_from_scryfall(name, card, prices))
+    return card_infos
+
+
+class CardResolver:
+    """
+    Thread safe card info lookup shared by all decks being parsed. Resolved card info is kept in card_info
+    (CARD_INFO_DICT by default). Fresh entries of the persistent card cache are used first, then cards are
+    looked up in the local card store (see update-db); only cards missing from both are requested from the
+    Scryfall API. Looked up cards are written back to the cache.
+
+    Usage
+    -------
+    resolver = CardResolver(card_store=store, card_cache=cache)
+    resolver.resolve(['Rancor', 'Forest'])
+    rancor = resolver['Rancor']
+    """
+
+    def __init__(self, card_store: CardStore = None, card_cache: CardCache = None,
+                 client: scryfall.ScryfallClient = None, card_info=None):
+        self.card_store = card_store
+        self.card_cache = card_cache
+        self.client = client
+        self.card_info = CARD_INFO_DICT if card_info is None else card_info
+        self.lock = threading.Lock()
+
+    def __getitem__(self, card_name):
+        with self.lock:
+            return self.card_info[card_name]
+
+    def store(self, card_info, cache=True):
+        self.card_info[card_info['name']] = card_info
+        if cache and self.card_cache is not None:
+            self.card_cache.put(card_info)
+
+    def resolve(self, card_names):
+        """Make sure the info of all given cards is available. Concurrent calls are serialized."""
+        with self.lock:
+            missing = [name for name in dict.fromkeys(card_names) if name not in self.card_info]
+            if self.card_cache is not None:
+                for name in missing:
+                    card_info = self.card_cache.get(name)
+                    if card_info is not None:
+                        self.store(card_info, cache=False)
+                missing = [name for name in missing if name not in self.card_info]
+            if not missing:
+                return
+
+            if self.card_store is not None:
+                found = self.card_store.get_many(missing)
+                prices = self.card_store.get_prices(card['name'] for card in found.values())
+                for name, card in found.items():
+                    self.store(card_info_from_scryfall(name, card, prices[card['name']]))
+                missing = [name for name in missing if name not in found]
+
+            if missing:
+                logging.info(f"{len(missing)} cards not found in card database, requesting them from Scryfall: "
+                             f"{', '.join(missing)}.")
+                for card_info in fetch_card_info(missing, client=self.client):
+                    self.store(card_info)
+
+
 def get_path(name, decks_path):
     """
     Returns the deck path from name
@@ -209,14 +305,9 @@ def sort_card_list(card_list):
     return sorted_list
 
 
-def store_card_info(card_info):
-    global CARD_INFO_DICT
-    CARD_INFO_DICT[card_info['name']] = card_info
-
-
-def parse_decklist(deck_file):
+def read_decklist(deck_file):
     """
-    Parses a decklist file
+    Reads the mainboard and sideboard of a decklist file, as lists of {'quantity', 'card_name'}.
     """
     is_mainboard = True
     mainboard = []
@@ -233,29 +324,15 @@ def parse_decklist(deck_file):
                 else:
                     sideboard.append({'quantity': card_line[0],
                                       'card_name': card_line[1]})
+    return mainboard, sideboard
 
-    # Get card info
-    for card in mainboard:
-        try:
-            # Try to grab info from cache dict
-            card.update(CARD_INFO_DICT[card['card_name']])
-        except KeyError:
-            # If info not in cache grab it from Scryfall API and update cache
-            card_info = get_card_data(card['card_name'])
-            card.update(card_info)
-            store_card_info(card_info)
-            time.sleep(50 / 1000)
-
-    for card in sideboard:
-        try:
-            # Try to grab info from cache dict
-            card.update(CARD_INFO_DICT[card['card_name']])
-        except KeyError:
-            # If info not in cache grab it from Scryfall API and update cache
-            card_info = get_card_data(card['card_name'])
-            card.update(card_info)
-            store_card_info(card_info)
-            time.sleep(50 / 1000)
+
+def add_card_info(mainboard, sideboard, resolver: CardResolver):
+    """
+    Adds the card info of already resolved cards to a decklist and sorts it by converted mana cost.
+    """
+    for card in mainboard + sideboard:
+        card.update(resolver[card['card_name']])
 
     # Sort decklist by converted mana cost
     sorted_mainboard = sort_card_list(mainboard)
@@ -266,14 +343,142 @@ def parse_decklist(deck_file):
     return mainboard, sideboard
 
 
-def parse_deck_files(decks_path: Path):
+def update_card_info(mainboard, sideboard, card_info):
+    """
+    Updates the cards of a parsed decklist with the card info of card_info (by card name) where available,
+    and sorts it again by converted mana cost.
+    """
+    for card in mainboard + sideboard:
+        if card['card_name'] in card_info:
+            card.update(card_info[card['card_name']])
+    return sort_card_list(mainboard), sort_card_list(sideboard)
+
+
+def parse_decklist(deck_file, resolver: CardResolver = None):
+    """
+    Parses a decklist file
+    """
+    if resolver is None:
+        resolver = CardResolver()
+    mainboard, sideboard = read_decklist(deck_file)
+
+    # Get card info
+    resolver.resolve([card['card_name'] for card in mainboard + sideboard])
+    return add_card_info(mainboard, sideboard, resolver)
+
+
+def deck_price(deck):
+    """
+    Price of a parsed deck (sum of the best price of each card), formatted with 2 decimals.
+    """
+    price = 0
+    for card in deck['mainboard']:
+        if card['best_price']:
+            price += float(card['best_price'][1]) * int(card['quantity'])
+    for card in deck['sideboard']:
+        if card['best_price']:
+            price += float(card['best_price'][1]) * int(card['quantity'])
+    return '{:.2f}'.format(price)
+
+
+def read_deck(deck, decks_path: Path):
     """
-    Parses deck files for all decks in decks.json."""
+    Reads the deck file of a deck from decks.json. Returns the deck with its last modified date, mainboard
+    and sideboard (without card info), or None if the deck file does not exist.
+    """
+    try:
+        # Get path to deck file
+        deck_path = get_path(deck['name'], decks_path)
+        # Get last modified date
+        date_modified_datetime = datetime.datetime.fromtimestamp(os.path.getmtime(deck_path))
+        date_modified_string = date_modified_datetime.strftime('%Y-%m-%d')
+        deck['last_modified'] = date_modified_string
+        deck['mainboard'], deck['sideboard'] = read_decklist(deck_path)
+    except FileNotFoundError as e:
+        print(f"\nDeck file not found for {deck['name']}! ({e})")
+        logging.warning(f"Deck file not found for {deck['name']}! ({e}).")
+        return None
+    return deck
+
+
+def load_deck_manifest(decks_path: Path):
+    """
+    Load the manifest of the deck files processed by the previous run: {deck name: {mtime, size, sha256}}.
+    """
+    try:
+        with open(decks_path / 'decks-manifest.json', 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_deck_manifest(decks_path: Path, manifest):
+    """
+    Save the manifest of processed deck files, replacing the previous one atomically.
+    """
+    tmp_path = decks_path / 'decks-manifest.json.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, decks_path / 'decks-manifest.json')
+
+
+def deck_file_state(deck_path: Path, previous=None):
+    """
+    Modification time, size and content hash of a deck file, or None if it does not exist. The file is only
+    hashed if its modification time or size differ from the previous state.
+    """
+    try:
+        stat = deck_path.stat()
+    except FileNotFoundError:
+        return None
+    if previous is not None and previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size:
+        return previous
+    with open(deck_path, 'rb') as f:
+        sha256 = hashlib.sha256(f.read()).hexdigest()
+    return {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha256': sha256}
+
+
+def load_previous_results(decks_path: Path):
+    """
+    Decks (by name) and card info of the previous run, from decks_full.json and cards.json.
+    """
+    try:
+        with open(decks_path / 'decks_full.json', 'r') as f:
+            previous_decks = {deck['name']: deck for deck in json.load(f)}
+        with open(decks_path / 'cards.json', 'r') as f:
+            previous_cards = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}, {}
+    return previous_decks, previous_cards
+
+
+def parse_deck_files(decks_path: Path, db_path: Path = None, static_ttl=STATIC_TTL, price_ttl=PRICE_TTL,
+                     api_url=scryfall.API_URL, workers=8, full=False, output_format=None):
+    """
+    Parses deck files for all decks in decks.json, in stages:
+        0. scan: deck files are compared with the manifest of the previous run (modification time, size and
+           content hash, see decks-manifest.json). Unless full is True, the previous results are kept for
+           unchanged decks, and only new or modified decks go through the next stages. Decks removed from
+           decks.json are dropped.
+        1. read: all deck files are read and parsed concurrently by a pool of workers.
+        2. resolve: the unique cards of all decks are resolved at once. Card info is taken from the card
+           database at db_path (cards.sqlite, see update-db) when available, otherwise from the Scryfall API
+           at api_url. Card info is cached in card-cache.jsonl across runs; cached static card data and
+           prices are refreshed after static_ttl and price_ttl seconds respectively.
+        3. price: card info is added to each deck, which is then sorted and priced in memory.
+        4. save: deck and card data are saved to JSON. If output_format is given ('json', 'orjson' or
+           'msgpack'), decks are also saved in the normalized format (see deck_files).
+    The duration of each stage is printed and logged."""
+    # Check the output format first, so a missing serializer does not stop the run after decks_full.json is saved
+    if output_format is not None:
+        deck_files.serializer(output_format)
+
     # Logging config
     log_file = decks_path / 'scryfall.log'
     logging.basicConfig(filename=log_file, filemode='w', level=logging.INFO)
 
     start_time = time.time()
+    timings = {}
     print('Grabbing data...')
     logging.info('Grabbing data...')
 
@@ -288,10 +493,8 @@ def parse_deck_files(decks_path: Path):
     # Sort list of decks by deck name
     all_decks = sorted(deck_list, key=lambda k: k['name'])
 
-    all_decks_list = []
-    progress_bar = tqdm(all_decks)
-    for i, deck in enumerate(progress_bar):
-        # Get list of colors from family
+    # Get list of colors from family
+    for deck in all_decks:
         if deck['family']:
             try:
                 deck['color'] = COLORS[deck['family']]
@@ -300,45 +503,110 @@ def parse_deck_files(decks_path: Path):
         else:
             logging.info(f"No specified family for deck {deck['name']}.")
 
-        try:
-            # Get path to deck file
-            deck_path = get_path(deck['name'], decks_path)
-            # Get last modified date
-            date_modified_datetime = datetime.datetime.fromtimestamp(os.path.getmtime(deck_path))
-            date_modified_string = date_modified_datetime.strftime('%Y-%m-%d')
-            deck['last_modified'] = date_modified_string
-
-        except FileNotFoundError as e:
-            print(f"\nDeck file not found for {deck['name']}! ({e})")
-            logging.warning(f"Deck file not found for {deck['name']}! ({e}).")
+    # Stage 0: find new and modified deck files
+    stage_start = time.time()
+    if full:
+        manifest, previous_decks, previous_cards = {}, {}, {}
+    else:
+        manifest = load_deck_manifest(decks_path)
+        previous_decks, previous_cards = load_previous_results(decks_path)
+    new_manifest = {}
+    decks_by_name = {}
+    changed_decks = []
+    for deck in all_decks:
+        previous_state = manifest.get(deck['name'])
+        state = deck_file_state(get_path(deck['name'], decks_path), previous_state)
+        if state is None:
+            # Decks without a deck file are left out, like in read_deck
+            print(f"\nDeck file not found for {deck['name']}!")
+            logging.warning(f"Deck file not found for {deck['name']}!")
             continue
+        new_manifest[deck['name']] = state
+        previous_deck = previous_decks.get(deck['name'])
+        if previous_deck is not None and previous_state is not None and previous_state['sha256'] == state['sha256']:
+            # Keep previous decklist and price, with the current info from decks.json
+            unchanged_deck = {k: v for k, v in previous_deck.items() if k != 'color'}
+            unchanged_deck.update(deck)
+            unchanged_deck['last_modified'] = datetime.datetime.fromtimestamp(state['mtime']).strftime('%Y-%m-%d')
+            decks_by_name[deck['name']] = unchanged_deck
+        else:
+            changed_decks.append(deck)
+    timings['scan'] = time.time() - stage_start
+    logging.info(f'{len(changed_decks)} new or modified decks.')
+
+    up_to_date = not changed_decks and decks_by_name == previous_decks
+    if output_format is not None:
+        up_to_date = up_to_date and deck_files.normalized_path(decks_path, output_format).exists()
+    if up_to_date:
+        save_deck_manifest(decks_path, new_manifest)
+        print('Deck data is up to date.')
+        logging.info('Deck data is up to date.')
+        return
 
-        # Parse decklist from file
-        deck['mainboard'], deck['sideboard'] = parse_decklist(deck_path)
-
-        # Calculated decklist price
-        price = 0
-        for card in deck['mainboard']:
-            if card['best_price']:
-                price += float(card['best_price'][1]) * int(card['quantity'])
-        for card in deck['sideboard']:
-            if card['best_price']:
-                price += float(card['best_price'][1]) * int(card['quantity'])
-        deck['price'] = '{:.2f}'.format(price)
-
-        all_decks_list.append(deck)
-
-        progress_bar.set_description(f"Completed {deck['name']}")
+    # Stage 1: read and parse deck files concurrently
+    stage_start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        read_decks = list(tqdm(executor.map(lambda d: read_deck(d, decks_path), changed_decks),
+                               total=len(changed_decks)))
+    new_decks_list = [deck for deck in read_decks if deck is not None]
+    timings['read'] = time.time() - stage_start
+
+    # Stage 2: resolve the unique cards of all new decks at once
+    stage_start = time.time()
+    card_store = None
+    if db_path is not None and db_path.exists():
+        card_store = CardStore(db_path)
+    else:
+        print('Card database not found, card data will be requested from Scryfall (run update-db first).')
+        logging.warning('Card database not found, using Scryfall API.')
+    card_cache = CardCache(decks_path / 'card-cache.jsonl', static_ttl=static_ttl, price_ttl=price_ttl)
+    resolver = CardResolver(card_store=card_store, card_cache=card_cache, client=scryfall.get_client(api_url))
+    resolver.resolve(card['card_name'] for deck in new_decks_list for card in deck['mainboard'] + deck['sideboard'])
+    timings['resolve'] = time.time() - stage_start
+
+    # Stage 3: add card info, sort and price new decks in memory, then merge them with unchanged decks. Cards
+    # resolved again in this run (e.g. with refreshed prices) are also updated in unchanged decks, so every
+    # deck and cards.json have the same info for each card.
+    stage_start = time.time()
+    for deck in decks_by_name.values():
+        if any(card['card_name'] in resolver.card_info for card in deck['mainboard'] + deck['sideboard']):
+            deck['mainboard'], deck['sideboard'] = update_card_info(deck['mainboard'], deck['sideboard'],
+                                                                    resolver.card_info)
+            deck['price'] = deck_price(deck)
+    for deck in new_decks_list:
+        deck['mainboard'], deck['sideboard'] = add_card_info(deck['mainboard'], deck['sideboard'], resolver)
+        deck['price'] = deck_price(deck)
+        decks_by_name[deck['name']] = deck
+    all_decks_list = [decks_by_name[deck['name']] for deck in all_decks if deck['name'] in decks_by_name]
+    used_cards = {card['card_name'] for deck in all_decks_list for card in deck['mainboard'] + deck['sideboard']}
+    all_cards = {name: info for name, info in {**previous_cards, **resolver.card_info}.items() if name in used_cards}
+    timings['price'] = time.time() - stage_start
+
+    if card_store is not None:
+        card_store.close()
+    card_cache.close()
+    stats = card_cache.stats()
+    cache_report = (f"Card cache: {stats['hits']} hits, {stats['stale']} stale, {stats['misses']} misses "
+                    f"(hit rate {stats['hit_rate']:.1%})")
+    print(f'\n{cache_report}')
+    logging.info(cache_report)
+
+    # Stage 4: save deck and card data
+    stage_start = time.time()
 
     # Save deck data to JSON
     full_decks_path = decks_path / 'decks_full.json'
     with open(full_decks_path, 'w') as decks_json:
         json.dump(all_decks_list, decks_json, sort_keys=True, indent=2)
 
+    # Save normalized deck data
+    if output_format is not None:
+        deck_files.save_decks(decks_path, all_decks_list, output_format)
+
     # Save card data to JSON
     cards_path = decks_path / 'cards.json'
     with open(cards_path, 'w') as cards_json:
-        json.dump(CARD_INFO_DICT, cards_json, sort_keys=True, indent=2)
+        json.dump(all_cards, cards_json, sort_keys=True, indent=2)
 
     # Save deck data to JSON (simple)
     KEYS_TO_REMOVE = ['card_name', 'prices', 'best_price', 'scryfall_uri', 'cmc', 'legalities', 'image_uris',
@@ -355,5 +623,106 @@ def parse_deck_files(decks_path: Path):
     with open(simple_decks_path, 'w') as decks_simple_json:
         json.dump(all_decks_list, decks_simple_json, sort_keys=True, indent=2)
 
+    # Save manifest last, so an interrupted run is redone on the next one
+    save_deck_manifest(decks_path, new_manifest)
+    timings['save'] = time.time() - stage_start
+
+    timings_report = 'Stage timings: ' + ', '.join(f'{stage} {t:.2f}s' for stage, t in timings.items())
+    print(timings_report)
+    logging.info(timings_report)
+
     print('\nCompleted in {0:.1f} minutes'.format((time.time() - start_time) / 60))
     logging.info('Completed in {0:.1f} minutes'.format((time.time() - start_time) / 60))
+
+
+def refresh_prices(decks_path: Path, db_path: Path):
+    """
+    Refresh card and deck prices of the deck data files without parsing decks again. The MTGO prices of all
+    cards in cards.json are taken from the card database at db_path (the default_cards snapshot loaded by
+    update-db) and written to the card cache. Deck prices are then recomputed in a single vectorized pass,
+    and only the price fields of decks_full.json, decks_simple.json and cards.json (and of the normalized deck
+    data files, if any) are rewritten.
+    """
+    start_time = time.time()
+    with open(decks_path / 'decks_full.json', 'r') as f:
+        full_decks = json.load(f)
+    with open(decks_path / 'decks_simple.json', 'r') as f:
+        simple_decks = json.load(f)
+    with open(decks_path / 'cards.json', 'r') as f:
+        cards = json.load(f)
+
+    # Get the prices of all cards from the price snapshot
+    with CardStore(db_path) as card_store:
+        found = card_store.get_many(cards)
+        prices = card_store.get_prices(card['name'] for card in found.values())
+    with CardCache(decks_path / 'card-cache.jsonl') as card_cache:
+        for name, card in found.items():
+            card_prices = prices[card['name']]
+            best_price = min(card_prices, key=lambda x: float(x[1])) if card_prices else None
+            cards[name].update({'prices': card_prices, 'best_price': best_price})
+            card_cache.update_prices(name, card_prices, best_price)
+    not_found = len(cards) - len(found)
+    if not_found:
+        print(f'{not_found} cards not found in card database, keeping their previous prices.')
+
+    # Recompute deck prices: sum of quantity * best price over the cards of each deck
+    card_index = {name: i for i, name in enumerate(cards)}
+    best_prices = np.array([float(info['best_price'][1]) if info['best_price'] else 0.0 for info in cards.values()])
+    deck_index, card_ids, quantities = [], [], []
+    for i, deck in enumerate(full_decks):
+        for card in deck['mainboard'] + deck['sideboard']:
+            deck_index.append(i)
+            card_ids.append(card_index[card['card_name']])
+            quantities.append(int(card['quantity']))
+    deck_prices = np.bincount(deck_index, weights=np.array(quantities) * best_prices[card_ids],
+                              minlength=len(full_decks))
+
+    # Update price fields
+    prices_by_name = {}
+    for deck, price in zip(full_decks, deck_prices):
+        deck['price'] = '{:.2f}'.format(price)
+        prices_by_name[deck['name']] = deck['price']
+        for card in deck['mainboard'] + deck['sideboard']:
+            card['prices'] = cards[card['card_name']]['prices']
+            card['best_price'] = cards[card['card_name']]['best_price']
+    for deck in simple_decks:
+        deck['price'] = prices_by_name[deck['name']]
+
+    for file_name, data in [('decks_full.json', full_decks), ('decks_simple.json', simple_decks),
+                            ('cards.json', cards)]:
+        tmp_path = decks_path / f'{file_name}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, sort_keys=True, indent=2)
+        os.replace(tmp_path, decks_path / file_name)
+    for format_ in ['json', 'msgpack']:
+        if deck_files.normalized_path(decks_path, format_).exists():
+            deck_files.save_decks(decks_path, full_decks, format_)
+
+    print(f'Refreshed prices of {len(found)} cards and {len(full_decks)} decks in {time.time() - start_time:.1f} s')
+
+
+def benchmark_create_json(sizes=(1000, 5000, 10000, 50000)):
+    """
+    Time create_json on generated deck collections of increasing size, where half of the decks are in the
+    previous decks.json. The time per deck should stay about constant.
+    """
+    families = FAMILIES + ['']
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            decks_path = Path(tmp_dir)
+            (decks_path / 'valid').mkdir()
+            names = [f'{families[i % len(families)]} deck {i}' for i in range(size)]
+            for name in names:
+                (decks_path / 'valid' / f'{name}.txt').touch()
+            with open(decks_path / 'decks.json', 'w') as f:
+                json.dump([{'name': name, 'tags': ['old'], 'family': None, 'source': {'name': None, 'link': None}}
+                           for name in names[::2]], f)
+
+            start_time = time.perf_counter()
+            create_json(decks_path)
+            elapsed = time.perf_counter() - start_time
+        print(f'{size:>6} decks: {elapsed:.3f} s ({elapsed / size * 1e6:.1f} us per deck)')
+
+
+if __name__ == '__main__':
+    benchmark_create_json()
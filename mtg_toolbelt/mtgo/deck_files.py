@@ -0,0 +1,115 @@
+"""
+Normalized deck data files.
+
+decks_full.json repeats the full card info in every card of every deck. The normalized format stores the
+info of each card once, and decks reference cards by id (their index in the card list):
+
+{
+    'cards': [{'name': 'Rancor', 'cmc': 1.0, ...}, ...],
+    'decks': [{'name': 'Stompy', 'price': '12.34', ..., 'mainboard': [[0, '4'], ...], 'sideboard': [...]}, ...]
+}
+
+It can be saved as compact JSON (standard library or orjson) or msgpack, and load_decks rehydrates it to the
+same list of decks as decks_full.json.
+"""
+
+import json
+from pathlib import Path
+
+
+# Output formats and their file extensions
+FORMATS = {'json': '.json', 'orjson': '.json', 'msgpack': '.msgpack'}
+
+FILE_NAME = 'decks_normalized'
+
+
+def _import(module_name):
+    try:
+        return __import__(module_name)
+    except ImportError:
+        raise ImportError(f'The {module_name} output format requires {module_name} (pip install {module_name}).')
+
+
+def serializer(format_='json'):
+    """Function which serializes normalized deck data to bytes in a format. Raises ValueError for an unknown
+    format and ImportError if the module of the format is not installed."""
+    if format_ not in FORMATS:
+        raise ValueError(f"Unknown output format '{format_}', choose one of: {', '.join(FORMATS)}.")
+    if format_ == 'json':
+        return lambda data: json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if format_ == 'orjson':
+        return _import('orjson').dumps
+    return _import('msgpack').packb
+
+
+def normalize(decks):
+    """Normalized deck data (see module docstring) from a list of decks as in decks_full.json."""
+    card_ids = {}
+    cards = []
+    normalized_decks = []
+    for deck in decks:
+        normalized_deck = {k: v for k, v in deck.items() if k not in ('mainboard', 'sideboard')}
+        for board in ('mainboard', 'sideboard'):
+            normalized_deck[board] = []
+            for card in deck[board]:
+                card_id = card_ids.get(card['card_name'])
+                if card_id is None:
+                    card_id = card_ids[card['card_name']] = len(cards)
+                    cards.append({k: v for k, v in card.items() if k not in ('quantity', 'card_name')})
+                normalized_deck[board].append([card_id, card['quantity']])
+        normalized_decks.append(normalized_deck)
+    return {'cards': cards, 'decks': normalized_decks}
+
+
+def rehydrate(data):
+    """List of decks as in decks_full.json from normalized deck data."""
+    cards = data['cards']
+    decks = []
+    for normalized_deck in data['decks']:
+        deck = dict(normalized_deck)
+        for board in ('mainboard', 'sideboard'):
+            deck[board] = [{'quantity': quantity, 'card_name': cards[card_id]['name'], **cards[card_id]}
+                           for card_id, quantity in normalized_deck[board]]
+        decks.append(deck)
+    return decks
+
+
+def normalized_path(decks_path: Path, format_='json'):
+    """Path of the normalized deck data file of a format."""
+    if format_ not in FORMATS:
+        raise ValueError(f"Unknown output format '{format_}', choose one of: {', '.join(FORMATS)}.")
+    return Path(decks_path) / (FILE_NAME + FORMATS[format_])
+
+
+def save_decks(decks_path: Path, decks, format_='json'):
+    """Save decks (as in decks_full.json) normalized to decks_path/decks_normalized.<ext>. Returns the path."""
+    file_path = normalized_path(decks_path, format_)
+    content = serializer(format_)(normalize(decks))
+
+    tmp_path = file_path.with_name(file_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    tmp_path.replace(file_path)
+    return file_path
+
+
+def load_normalized(file_path: Path):
+    """Load normalized deck data, in the format given by the file extension. JSON is read with orjson when
+    it is installed."""
+    file_path = Path(file_path)
+    with open(file_path, 'rb') as f:
+        content = f.read()
+
+    if file_path.suffix == '.msgpack':
+        return _import('msgpack').unpackb(content)
+    try:
+        import orjson
+    except ImportError:
+        return json.loads(content)
+    return orjson.loads(content)
+
+
+def load_decks(file_path: Path):
+    """Load a normalized deck data file and rehydrate it to the list of decks as in decks_full.json."""
+    return rehydrate(load_normalized(file_path))
+
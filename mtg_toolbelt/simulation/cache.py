@@ -0,0 +1,102 @@
+"""
+On-disk cache of simulation results.
+
+Each result is stored in its own JSON file, named after a hash of the simulation parameters. When the
+cache grows above a maximum size, the least recently used results are deleted. The size of the cache is
+tracked as results are saved, so the directory is only scanned when it may be full.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from mtg_toolbelt.utils import setup_dir
+
+
+# Maximum size of the cache directory, in bytes
+MAX_SIZE = 50 * 1024 ** 2
+
+# Eviction deletes results until the cache is at most this fraction of its maximum size, so the next saves do
+# not evict again
+EVICT_TO = 0.9
+
+# Size of each cache directory as last scanned plus the results saved since, by this process. Other
+# processes also saving results make it an underestimate, which is corrected by the next eviction.
+_sizes = {}
+
+
+def cache_key(params):
+    """Hash of a (JSON serializable) dictionary of parameters."""
+    params_json = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(params_json.encode('utf-8')).hexdigest()
+
+
+def load(cache_dir: Path, params):
+    """Return the cached results for the given parameters, or None if they are not in the cache."""
+    entry_path = Path(cache_dir) / f"{cache_key(params)}.json"
+    try:
+        with open(entry_path, 'r') as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    # Mark as recently used
+    try:
+        os.utime(entry_path)
+    except FileNotFoundError:
+        pass
+
+    return entry['results']
+
+
+def save(cache_dir: Path, params, results, max_size=MAX_SIZE):
+    """Store results for the given parameters, then evict old results if the cache is too big."""
+    setup_dir(cache_dir)
+    entry_path = Path(cache_dir) / f"{cache_key(params)}.json"
+
+    # Write to a temporary file first so other processes never read a partial entry
+    tmp_path = entry_path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'params': params, 'results': results}, f)
+    entry_size = tmp_path.stat().st_size
+    os.replace(tmp_path, entry_path)
+
+    key = str(cache_dir)
+    if key in _sizes:
+        _sizes[key] += entry_size
+    else:
+        _sizes[key] = cache_size(cache_dir)
+    if _sizes[key] > max_size:
+        _sizes[key] = evict(cache_dir, max_size)
+
+
+def _entries(cache_dir: Path):
+    """(modification time, size, path) of each result in the cache."""
+    entries = []
+    for entry_path in Path(cache_dir).glob('*.json'):
+        try:
+            stat = entry_path.stat()
+        except FileNotFoundError:  # deleted by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry_path))
+    return entries
+
+
+def cache_size(cache_dir: Path):
+    """Total size of the results in the cache, in bytes."""
+    return sum(size for _, size, _ in _entries(cache_dir))
+
+
+def evict(cache_dir: Path, max_size=MAX_SIZE):
+    """If the cache is larger than max_size bytes, delete the least recently used results until it is at most
+    EVICT_TO * max_size bytes. Returns the size of the cache."""
+    entries = _entries(cache_dir)
+    total_size = sum(size for _, size, _ in entries)
+    if total_size <= max_size:
+        return total_size
+    for _, size, entry_path in sorted(entries):
+        if total_size <= EVICT_TO * max_size:
+            break
+        entry_path.unlink(missing_ok=True)
+        total_size -= size
+    return total_size
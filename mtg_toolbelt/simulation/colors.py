@@ -0,0 +1,293 @@
+"""
+Multi-color mana simulation.
+
+Generalizes the simulation in the mana module to decks with several colors. The deck is a vector of card
+categories (lands by the colors they produce and non-land cards) and the success condition is being able
+to cast a spell with a given mana cost on a given turn.
+"""
+
+from dataclasses import dataclass, field
+import functools
+from itertools import combinations
+import re
+from typing import Dict, List
+import numpy as np
+from mtg_toolbelt.simulation.mana import MIN_LANDS, MAX_LANDS, MAX_BATCH_SIZE
+
+
+# Colors of mana, in the order used for mana costs
+COLOR_SYMBOLS = ['W', 'U', 'B', 'R', 'G']
+
+
+@dataclass
+class ColorDeck:
+    lands: Dict[str, int]  # number of lands by the colors they produce, e.g. {'U': 8, 'B': 7, 'UB': 2, 'C': 1}
+    non_lands: int  # number of non-land cards
+    categories: List[str] = field(init=False)  # land categories, in the order used by counts and produces
+    counts: np.ndarray = field(init=False)  # number of cards by category, non-land cards last
+    produces: np.ndarray = field(init=False)  # produces[i, j] is True if land category i makes color j
+
+    def __post_init__(self):
+        self.categories = list(self.lands)
+        self.counts = np.array([self.lands[c] for c in self.categories] + [self.non_lands], dtype=np.int64)
+        self.produces = np.array([[color in category.upper() for color in COLOR_SYMBOLS]
+                                  for category in self.categories], dtype=bool).reshape(-1, len(COLOR_SYMBOLS))
+
+    @property
+    def size(self):
+        return int(self.counts.sum())
+
+    @property
+    def n_lands(self):
+        return int(self.counts[:-1].sum())
+
+
+@dataclass
+class ManaCost:
+    generic: int  # generic mana, e.g. 1 for {1}{U}{U}
+    pips: Dict[str, int]  # colored mana symbols, e.g. {'U': 2} for {1}{U}{U}
+
+    @classmethod
+    def parse(cls, mana_cost):
+        """Create a ManaCost from a mana cost string like '{1}{U}{U}' (Scryfall format) or '1UU'."""
+        symbols = re.findall(r'\{([^}]*)\}', mana_cost) if '{' in mana_cost else re.findall(r'\d+|[A-Za-z]', mana_cost)
+        generic = 0
+        pips = {}
+        for symbol in symbols:
+            symbol = symbol.upper()
+            if symbol.isdigit():
+                generic += int(symbol)
+            elif symbol in COLOR_SYMBOLS:
+                pips[symbol] = pips.get(symbol, 0) + 1
+            else:
+                raise ValueError(f'Unsupported mana symbol: {symbol}.')
+        return cls(generic=generic, pips=pips)
+
+    @property
+    def cmc(self):
+        return self.generic + sum(self.pips.values())
+
+    def __str__(self):
+        generic = f"{{{self.generic}}}" if self.generic else ''
+        return generic + ''.join(f"{{{color}}}" * self.pips.get(color, 0) for color in COLOR_SYMBOLS)
+
+
+def _color_requirements(deck: ColorDeck, cost: ManaCost):
+    """Hall's condition for paying the colored pips of a cost.
+
+    The pips can be paid if, for every subset of the required colors, the number of lands that make at
+    least one of those colors is at least the number of pips of those colors.
+
+    RETURNS:
+        sources : numpy.ndarray
+            sources[i, s] is 1 if land category i makes at least one color of subset s.
+        pips : numpy.ndarray
+            Number of pips of each subset.
+    """
+    colors = [COLOR_SYMBOLS.index(color) for color in cost.pips]
+    subsets = [subset for size in range(1, len(colors) + 1) for subset in combinations(colors, size)]
+    sources = np.array([deck.produces[:, list(subset)].any(axis=1) for subset in subsets],
+                       dtype=np.int64).T.reshape(len(deck.categories), len(subsets))
+    pips = np.array([sum(cost.pips[COLOR_SYMBOLS[c]] for c in subset) for subset in subsets], dtype=np.int64)
+    return sources, pips
+
+
+def _draw(rng, deck_counts, n_draws):
+    """Draw n_draws cards from many decks at once. deck_counts[g, i] is the number of cards of category i
+    in the deck of game g. Returns the number of cards drawn by category, with the same shape."""
+    drawn = np.zeros_like(deck_counts)
+    cards_left = deck_counts.sum(axis=1)
+    draws_left = np.full(len(deck_counts), n_draws, dtype=np.int64)
+    for i in range(deck_counts.shape[1] - 1):
+        cards_left = cards_left - deck_counts[:, i]
+        drawn[:, i] = rng.hypergeometric(deck_counts[:, i], cards_left, draws_left)
+        draws_left = draws_left - drawn[:, i]
+    drawn[:, -1] = draws_left
+    return drawn
+
+
+def simulate_cost(deck: ColorDeck, mana_cost, turn, on_play=True, consider_mulligans=True, iterations=100000,
+                  seed=None, verbose=True):
+    """Simulate the probability of being able to cast a spell on a given turn.
+
+    Follows the same rules as mana.simulate: mulligans hands with less than MIN_LANDS or more than MAX_LANDS
+    lands, never below 4 cards, and returns one non-land card to the deck for each mulligan. A spell can be
+    cast if the lands in hand, limited to one land drop per turn, can pay its mana cost.
+
+    ARGUMENTS:
+        deck : ColorDeck
+            Deck to simulate.
+        mana_cost : str or ManaCost
+            Mana cost of the spell, e.g. '{1}{U}{U}'.
+        turn : int
+            Turn on which to cast the spell.
+        on_play, consider_mulligans, iterations, seed
+            Same as mana.simulate_numpy.
+        verbose : bool
+            Whether to print the simulation conditions and results.
+
+    RETURNS:
+        sim_results : dict
+    """
+    cost = ManaCost.parse(mana_cost) if isinstance(mana_cost, str) else mana_cost
+    if verbose:
+        print(f"Simulation conditions: {deck.size} card deck | lands {deck.lands} | cast {cost} on turn {turn} | "
+              f"{'on the play' if on_play else 'on the draw'} {'with' if consider_mulligans else 'without'} mulligan")
+
+    rng = np.random.default_rng(seed)
+    deck_counts = deck.counts
+
+    # Draw opening hand (7 cards)
+    hand = rng.multivariate_hypergeometric(deck_counts, 7, size=iterations, method='count')
+    n_mulligans = np.zeros(iterations, dtype=np.int64)
+
+    # Mulligan to 6, 5 and 4: draw a new hand of 7 for every bad hand. Never mulligans below 4 cards.
+    if consider_mulligans:
+        for mulligan in range(1, 4):
+            hand_lands = hand[:, :-1].sum(axis=1)
+            bad_hands = np.flatnonzero((hand_lands < MIN_LANDS) | (hand_lands > MAX_LANDS))
+            hand[bad_hands] = rng.multivariate_hypergeometric(deck_counts, 7, size=len(bad_hands), method='count')
+            n_mulligans[bad_hands] = mulligan
+
+    # Cards left in the deck. One non-land card is returned to the deck for each mulligan.
+    cards_left = deck_counts - hand
+    cards_left[:, -1] += n_mulligans
+
+    # Draw step for turn 2 onwards
+    first_draw_turn = 2 if on_play else 1
+    n_draws = max(turn + 1 - first_draw_turn, 0)
+    lands = (hand + _draw(rng, cards_left, n_draws))[:, :-1]
+
+    # Enough lands (one land drop per turn) and enough sources of each color
+    sources, pips = _color_requirements(deck, cost)
+    castable = (np.minimum(lands.sum(axis=1), turn) >= cost.cmc) & np.all(lands @ sources >= pips, axis=1)
+
+    count_games_castable = int(np.count_nonzero(castable))
+    mull6, mull5, mull4 = (int(np.count_nonzero(n_mulligans >= k)) for k in (1, 2, 3))
+    sim_results = {
+        'in': {
+            'lands': dict(deck.lands),
+            'non_lands': deck.non_lands,
+            'mana_cost': str(cost),
+            'turn': turn,
+            'on_play': on_play,
+            'consider_mulligans': consider_mulligans,
+            'iterations': iterations
+        },
+        'out': {
+            'prob_castable': count_games_castable / iterations,
+            'count_games_castable': count_games_castable,
+            'no_mulligan': iterations - mull6,
+            'mulligans_to_6': mull6 - mull5,
+            'mulligans_to_5': mull5 - mull4,
+            'mulligans_to_4': mull4
+        }
+    }
+    if verbose:
+        print(f" - Results after {iterations} iterations: Prob castable = {sim_results['out']['prob_castable']}")
+
+    return sim_results
+
+
+def _positions_below(positions, deck_size):
+    """below[g, t] is the number of positions of game g lower than t, for t from 0 to deck_size."""
+    iterations = len(positions)
+    bins = np.minimum(positions, deck_size) + (deck_size + 1) * np.arange(iterations)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=iterations * (deck_size + 1)).reshape(iterations, deck_size + 1)
+    below = np.zeros((iterations, deck_size + 1), dtype=np.int16)
+    below[:, 1:] = counts[:, :-1].cumsum(axis=1)
+    return below
+
+
+@functools.lru_cache(maxsize=4)
+def _shared_games(entropy, deck_size, n_draws, consider_mulligans, iterations):
+    """Opening hands and draws of games after 0 to 3 mulligans (or only 0 without mulligans), for any deck of
+    deck_size cards. Games are cached by the entropy of their seed, so calls with the same seed share them.
+
+    Cards are given by their position in the deck: in a deck with counts c, the cards of category i are at
+    positions sum(c[:i]) to sum(c[:i + 1]) - 1, and the non-land cards returned to the deck after the
+    mulligans are at positions deck_size and above.
+
+    RETURNS:
+        hands : list
+            hands[m][g, t] is the number of cards at positions below t in the opening hand of game g after m
+            mulligans, for t from 0 to deck_size.
+        seen : numpy.ndarray
+            Same for the opening hand and draws, in row m * iterations + g.
+    """
+    rng = np.random.default_rng([entropy, deck_size, n_draws])
+    hands, seen = [], []
+    for n_mulligans in range(4 if consider_mulligans else 1):
+        order = np.argsort(rng.random((iterations, deck_size)), axis=1)
+        returned = np.broadcast_to(np.arange(deck_size, deck_size + n_mulligans), (iterations, n_mulligans))
+        library = np.concatenate([order[:, 7:], returned], axis=1)
+        draws = np.take_along_axis(library, np.argsort(rng.random(library.shape), axis=1)[:, :n_draws], axis=1)
+        hands.append(_positions_below(order[:, :7], deck_size))
+        seen.append(_positions_below(np.concatenate([order[:, :7], draws], axis=1), deck_size))
+    seen = np.concatenate(seen)
+    for games in hands + [seen]:
+        games.flags.writeable = False
+    return hands, seen
+
+
+def sweep(decks: List[ColorDeck], mana_cost, turn, on_play=True, consider_mulligans=True, iterations=20000, seed=None):
+    """Probability of casting a spell on a given turn for many deck (land) configurations.
+
+    Follows the same rules as simulate_cost, but all decks with the same number of cards are simulated at
+    once from the same games (common random numbers): the cards of each game are drawn once as positions in
+    the deck, and each deck maps them to its own land categories. Differences between configurations are
+    then also more precise than with independent simulations. With the same seed, the result for a deck does
+    not depend on the other decks.
+
+    RETURNS:
+        probs : list
+            Probability for each deck, in the same order.
+    """
+    cost = ManaCost.parse(mana_cost) if isinstance(mana_cost, str) else mana_cost
+    entropy = (seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)).entropy
+    first_draw_turn = 2 if on_play else 1
+    n_draws = max(turn + 1 - first_draw_turn, 0)
+
+    # Land categories of all decks, in a fixed order so each deck gets the same games whatever the other decks.
+    # bounds[k] are the positions where each category starts in deck k.
+    categories = sorted({category for deck in decks for category in deck.categories})
+    sources, pips = _color_requirements(ColorDeck(lands=dict.fromkeys(categories, 0), non_lands=0), cost)
+    sources = sources.astype(np.float32)
+    counts = np.array([[deck.lands.get(category, 0) for category in categories] for deck in decks],
+                      dtype=np.int64).reshape(len(decks), len(categories))
+    bounds = np.concatenate([np.zeros((len(decks), 1), dtype=np.int64), counts.cumsum(axis=1)], axis=1)
+    sizes = np.array([deck.size for deck in decks], dtype=np.int64)
+
+    probs = np.zeros(len(decks))
+    for deck_size in np.unique(sizes):
+        hands, seen = _shared_games(entropy, int(deck_size), n_draws, consider_mulligans, iterations)
+        same_size = np.flatnonzero(sizes == deck_size)
+        chunk_size = max(MAX_BATCH_SIZE // iterations, 1)  # bounds memory
+        for chunk in np.split(same_size, range(chunk_size, len(same_size), chunk_size)):
+            # Mulligan hands with less than MIN_LANDS or more than MAX_LANDS lands, never below 4 cards
+            n_lands = bounds[chunk, -1]
+            n_mulligans = np.zeros((iterations, len(chunk)), dtype=np.int64)
+            for mulligan, hand in enumerate(hands[:-1], start=1):
+                hand_lands = hand[:, n_lands]
+                bad_hands = (hand_lands < MIN_LANDS) | (hand_lands > MAX_LANDS)
+                n_mulligans[(n_mulligans == mulligan - 1) & bad_hands] = mulligan
+
+            # Lands of each category in the opening hand and draws of the kept hand
+            rows = n_mulligans * iterations + np.arange(iterations)[:, None]
+            seen_bounds = seen[rows[:, :, None], bounds[chunk]]
+            lands = np.diff(seen_bounds, axis=2).astype(np.float32)
+
+            castable = (np.minimum(seen_bounds[:, :, -1], turn) >= cost.cmc) & np.all(lands @ sources >= pips, axis=2)
+            probs[chunk] = castable.mean(axis=0)
+    return probs.tolist()
+
+
+if __name__ == '__main__':
+    # Izzet deck: can we cast {1}{U}{U} on turn 3?
+    deck_ = ColorDeck(lands={'U': 9, 'R': 6, 'UR': 2}, non_lands=43)
+    simulate_cost(deck_, '{1}{U}{U}', turn=3, on_play=False)
+
+    # Sweep the number of blue sources
+    decks_ = [ColorDeck(lands={'U': n, 'R': 17 - n}, non_lands=43) for n in range(5, 18)]
+    for deck_, prob_ in zip(decks_, sweep(decks_, '{1}{U}{U}', turn=3)):
+        print(deck_.lands, f"{prob_:.3f}")
@@ -1,11 +1,24 @@
+from concurrent.futures import ProcessPoolExecutor
 import csv
 from dataclasses import dataclass
+import functools
+import inspect
+import math
+from pathlib import Path
 import random
+import numpy as np
+from mtg_toolbelt.simulation import cache
+from mtg_toolbelt.simulation.probability import hypergeom_prob, cum_hypergeom_prob, wilson_interval
 
 
 # Options
 MIN_LANDS = 2  # minimum number of lands in starting hand to keep hand. If less, mulligan hand
 MAX_LANDS = 5  # maximum number of lands in starting hand to keep hand. If more, mulligan hand
+PRECISION = 0.0025  # target half-width of the confidence interval in adaptive simulations (0.25%)
+CONFIDENCE_Z = 1.96  # z-score of the confidence interval in adaptive simulations (95%)
+MAX_ITERATIONS = 10000000  # default maximum number of games of an adaptive simulation
+MAX_BATCH_SIZE = 1000000  # maximum number of games simulated at once by an adaptive simulation (bounds memory)
+ENGINE_VERSION = 2  # part of the cache key. Increase it when a change to the engines changes their results
 
 
 @dataclass
@@ -50,8 +63,75 @@ class Deck:
         return card_type
 
 
+def _sim_results(deck_size, n_lands, n_desired_lands, turns, on_play, consider_mulligans, iterations,
+                 count_games_desired, count_games_any, mull6, mull5, mull4):
+    """Build the results dictionary shared by all simulation engines.
+
+    mull6, mull5 and mull4 are the number of games with at least one, two and three mulligans.
+    """
+    return {
+        'in': {
+            'deck_size': deck_size,
+            'n_lands': n_lands,
+            'n_desired_lands': n_desired_lands,
+            'turns': turns,
+            'on_play': on_play,
+            'consider_mulligans': consider_mulligans,
+            'iterations': iterations
+        },
+        'out': {
+            'prob_desired_land': count_games_desired / iterations,
+            'prob_any_land': count_games_any / iterations,
+            'count_games_desired': count_games_desired,
+            'count_games_any': count_games_any,
+            'no_mulligan': iterations - mull6,
+            'mulligans_to_6': mull6 - mull5,
+            'mulligans_to_5': mull5 - mull4,
+            'mulligans_to_4': mull4
+        }
+    }
+
+
+def cached(func=None, ignore=(), decode=None):
+    """Decorator to cache the results of a simulation engine on disk (see the cache module).
+
+    Adds a cache_dir argument to the engine. If it is given, results are looked up by the engine name,
+    ENGINE_VERSION and the arguments, and computed (and stored) only when they are not in the cache.
+
+    ignore lists the arguments the engine does not use, which are left out of the cache key so their results
+    are stored once. decode converts results loaded from the cache (JSON) back to what the engine returns,
+    e.g. integer dictionary keys.
+    """
+    if func is None:
+        return functools.partial(cached, ignore=ignore, decode=decode)
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, cache_dir=None, **kwargs):
+        if cache_dir is None:
+            return func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {k: v for k, v in bound.arguments.items() if k not in ignore}
+        params = {'engine': func.__name__, 'engine_version': ENGINE_VERSION, **arguments}
+
+        results = cache.load(cache_dir, params)
+        if results is None:
+            results = func(*args, **kwargs)
+            cache.save(cache_dir, params, results)
+        else:
+            print(f"Cached result: {arguments}")
+            if decode is not None:
+                results = decode(results)
+        return results
+
+    return wrapper
+
+
+@cached
 def simulate(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_play=True, consider_mulligans=True,
-             iterations=100000):
+             iterations=100000, seed=None):
     """Magic the Gathering draw simulation to evaluate probability of drawing a certain number of lands.
 
     Runs many simulations of a MtG game draw for a certain amount of turns.
@@ -75,13 +155,19 @@ def simulate(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_
             variables.
         iterations : int
             Repeat the simulation this number of times.
+        seed : int
+            Seed for the random number generator. Use it for reproducible results.
     """
+    if seed is not None:
+        random.seed(seed)
+
     # Print simulation conditions
     print(
         f"Simulation conditions: {deck_size} card deck | {n_lands} lands | {n_desired_lands} desired lands | {'on the play' if on_play else 'on the draw'} | run for {turns} turns {'with' if consider_mulligans else 'without'} mulligan")
 
     count_games_desired = 0  # number of games where you draw enough lands and the right colored sources
     count_games_any = 0  # number of relevant games where you draw enough lands
+    mull6, mull5, mull4 = 0, 0, 0  # number of games with at least one, two and three mulligans
 
     for i in range(iterations):
         # Initialize deck
@@ -99,7 +185,6 @@ def simulate(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_
 
         # Whether to account for the possibility of mulligans
         if consider_mulligans:
-            mull6, mull5, mull4 = 0, 0, 0
             # Check whether to mulligan
             if (lands_hand < MIN_LANDS) or (lands_hand > MAX_LANDS):
                 mulligan = True
@@ -184,10 +269,356 @@ def simulate(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_
 
     # Print results of N iterations
     prob_desired = count_games_desired / iterations
-    prob_any = count_games_any / iterations
     print(f" - Results after {iterations} iterations: Prob good mana curve = {prob_desired}")
 
-    sim_results = {
+    sim_results = _sim_results(
+        deck_size, n_lands, n_desired_lands, turns, on_play, consider_mulligans, iterations,
+        count_games_desired, count_games_any, mull6, mull5, mull4
+    )
+
+    return sim_results
+
+
+def _comb_table(n_max):
+    """Table of binomial coefficients, comb[n, k] = C(n, k) for 0 <= n, k <= n_max (Pascal's triangle)."""
+    comb = np.zeros((n_max + 1, n_max + 1))
+    comb[:, 0] = 1
+    for n in range(1, n_max + 1):
+        comb[n, 1:] = comb[n - 1, 1:] + comb[n - 1, :-1]
+    return comb
+
+
+def _draw_cdf(comb, desired, other, non_lands, n_draws):
+    """Cumulative distribution of the cards drawn (multivariate hypergeometric) for several deck compositions.
+
+    Row i is for a deck with desired[i], other[i] and non_lands[i] cards. Column a * (n_draws + 1) + b is
+    the probability of drawing up to a desired lands and b other lands (in that flattened order).
+    """
+    d, o, n = (np.asarray(x)[:, None, None] for x in (desired, other, non_lands))
+    a = np.arange(n_draws + 1)[:, None]  # desired lands drawn
+    b = np.arange(n_draws + 1)[None, :]  # other lands drawn
+    c = n_draws - a - b  # non-land cards drawn
+    pmf = comb[d, a] * comb[o, b] * comb[n, np.clip(c, 0, None)] * (c >= 0)
+
+    cdf = pmf.reshape(len(d), -1).cumsum(axis=1)
+    cdf /= cdf[:, -1:]
+    cdf[:, -1] = 1
+    return cdf
+
+
+def _sample_cdf(rng, cdf, rows):
+    """Sample outcome i from row rows[i] of a table of cumulative distributions, by inverse transform.
+
+    All rows are shifted by their index so they fit in one sorted array, and a guide table (one bin per
+    outcome) gives a starting point close to the answer, which is much faster than a binary search.
+    """
+    n_rows, n_outcomes = cdf.shape
+    flat_cdf = (cdf + np.arange(n_rows)[:, None]).ravel()
+    guide = np.searchsorted(flat_cdf, np.arange(n_rows * n_outcomes) / n_outcomes, side='right')
+
+    x = rows + rng.random(len(rows))
+    outcome = guide[(x * n_outcomes).astype(np.int64)]
+    behind = np.flatnonzero(flat_cdf[outcome] <= x)
+    while behind.size:
+        outcome[behind] += 1
+        behind = behind[flat_cdf[outcome[behind]] <= x[behind]]
+
+    return outcome - rows * n_outcomes
+
+
+def _draw_counts(rng, comb, desired, other, non_lands, n_draws):
+    """Sample the number of desired and other lands found when drawing n_draws cards from many decks at once.
+
+    Each deck i holds desired[i], other[i] and non_lands[i] cards. Decks with the same composition share
+    a table with the exact cumulative distribution of the outcomes.
+
+    RETURNS:
+        desired_drawn, other_drawn : numpy.ndarray
+    """
+    # Index decks by composition (a counting sort, much faster than np.unique for large arrays)
+    base = max(desired.max(), other.max(), non_lands.max()) + 1
+    key = (desired * base + other) * base + non_lands
+    states = np.flatnonzero(np.bincount(key))
+    lookup = np.zeros(base ** 3, dtype=np.int64)
+    lookup[states] = np.arange(len(states))
+
+    cdf = _draw_cdf(comb, states // base ** 2, states // base % base, states % base, n_draws)
+    outcome = _sample_cdf(rng, cdf, lookup[key])
+    return outcome // (n_draws + 1), outcome % (n_draws + 1)
+
+
+def _opening_hands(rng, comb, n_desired_lands, n_other_lands, n_non_lands, iterations, consider_mulligans):
+    """Draw the opening hands (7 cards) of many games at once, taking mulligans if needed.
+
+    RETURNS:
+        desired_lands_hand, other_lands_hand, n_mulligans : numpy.ndarray
+    """
+    # Draw opening hand (7 cards)
+    hand_cdf = _draw_cdf(comb, [n_desired_lands], [n_other_lands], [n_non_lands], 7)
+    hand = _sample_cdf(rng, hand_cdf, np.zeros(iterations, dtype=np.int64))
+    n_mulligans = np.zeros(iterations, dtype=np.int64)
+
+    # Mulligan to 6, 5 and 4: draw a new hand of 7 for every bad hand. Never mulligans below 4 cards.
+    if consider_mulligans:
+        for mulligan in range(1, 4):
+            hand_lands = hand // 8 + hand % 8
+            bad_hands = np.flatnonzero((hand_lands < MIN_LANDS) | (hand_lands > MAX_LANDS))
+            hand[bad_hands] = _sample_cdf(rng, hand_cdf, np.zeros(len(bad_hands), dtype=np.int64))
+            n_mulligans[bad_hands] = mulligan
+
+    return hand // 8, hand % 8, n_mulligans
+
+
+def _simulate_counts(rng, comb, deck_size, n_lands, n_desired_lands, turns, on_play, consider_mulligans, iterations):
+    """Vectorized simulation of many games.
+
+    RETURNS:
+        count_games_desired, count_games_any, mull6, mull5, mull4 : int
+            Number of games with enough desired lands, with enough lands and with at least one, two and
+            three mulligans.
+    """
+    n_other_lands = n_lands - n_desired_lands
+    n_non_lands = deck_size - n_lands
+
+    desired_lands_hand, other_lands_hand, n_mulligans = _opening_hands(
+        rng, comb, n_desired_lands, n_other_lands, n_non_lands, iterations, consider_mulligans
+    )
+
+    # Cards left in the deck. One non-land card is returned to the deck for each mulligan.
+    desired_left = n_desired_lands - desired_lands_hand
+    other_left = n_other_lands - other_lands_hand
+    non_lands_left = n_non_lands - (7 - desired_lands_hand - other_lands_hand) + n_mulligans
+
+    # Draw step for turn 2 onwards
+    first_draw_turn = 2 if on_play else 1
+    n_draws = max(turns + 1 - first_draw_turn, 0)
+    desired_drawn, other_drawn = _draw_counts(rng, comb, desired_left, other_left, non_lands_left, n_draws)
+
+    desired_lands_hand += desired_drawn
+    lands_hand = desired_lands_hand + other_lands_hand + other_drawn
+
+    # Count iterations where enough lands or desired lands are found
+    count_games_desired = int(np.count_nonzero(desired_lands_hand >= turns))
+    count_games_any = int(np.count_nonzero(lands_hand >= turns))
+    mull6, mull5, mull4 = (int(np.count_nonzero(n_mulligans >= k)) for k in (1, 2, 3))
+
+    return count_games_desired, count_games_any, mull6, mull5, mull4
+
+
+@cached
+def simulate_numpy(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_play=True,
+                   consider_mulligans=True, iterations=100000, seed=None):
+    """Vectorized (NumPy) version of `simulate`.
+
+    Instead of drawing card by card, all iterations are sampled at once from the exact distribution of
+    (desired lands, other lands) drawn, the mulligan rules are applied as array masks, and the draw steps
+    are sampled from what is left in each deck. Same arguments and return value as `simulate`.
+
+    ARGUMENTS:
+        seed : int or numpy.random.SeedSequence
+            Seed for the random number generator. Use it for reproducible results.
+    """
+    print(
+        f"Simulation conditions: {deck_size} card deck | {n_lands} lands | {n_desired_lands} desired lands | {'on the play' if on_play else 'on the draw'} | run for {turns} turns {'with' if consider_mulligans else 'without'} mulligan")
+
+    rng = np.random.default_rng(seed)
+    comb = _comb_table(deck_size)
+    count_games_desired, count_games_any, mull6, mull5, mull4 = _simulate_counts(
+        rng, comb, deck_size, n_lands, n_desired_lands, turns, on_play, consider_mulligans, iterations
+    )
+
+    sim_results = _sim_results(
+        deck_size, n_lands, n_desired_lands, turns, on_play, consider_mulligans, iterations,
+        count_games_desired, count_games_any, mull6, mull5, mull4
+    )
+    print(f" - Results after {iterations} iterations: Prob good mana curve = {sim_results['out']['prob_desired_land']}")
+
+    return sim_results
+
+
+@cached
+def simulate_adaptive(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_play=True,
+                      consider_mulligans=True, iterations=MAX_ITERATIONS, seed=None, precision=PRECISION,
+                      batch_size=10000):
+    """Vectorized simulation that runs only as many iterations as needed for a given precision.
+
+    Runs batches of games until the half-width of the Wilson confidence interval (see CONFIDENCE_Z) of the
+    probability of a good mana curve is below precision, or until iterations games have been played. After
+    each batch, the size of the next one is estimated from the current probability, up to MAX_BATCH_SIZE
+    games so memory use does not grow with the number of iterations.
+
+    RETURNS:
+        sim_results : dict
+            Same as `simulate`. 'out' also has the number of 'iterations' used, the confidence interval
+            'ci_desired_land' as [low, high] and 'precision_met', False if the maximum number of iterations
+            was reached before the target precision.
+    """
+    if iterations < 1:
+        raise ValueError('iterations must be at least 1.')
+    print(
+        f"Simulation conditions: {deck_size} card deck | {n_lands} lands | {n_desired_lands} desired lands | {'on the play' if on_play else 'on the draw'} | run for {turns} turns {'with' if consider_mulligans else 'without'} mulligan | precision {precision}")
+
+    rng = np.random.default_rng(seed)
+    comb = _comb_table(deck_size)
+    counts = np.zeros(5, dtype=np.int64)  # count_games_desired, count_games_any, mull6, mull5, mull4
+    total = 0
+    batch = min(batch_size, iterations)
+    precision_met = False
+    while batch > 0:
+        counts += _simulate_counts(rng, comb, deck_size, n_lands, n_desired_lands, turns, on_play,
+                                   consider_mulligans, batch)
+        total += batch
+
+        low, high = wilson_interval(int(counts[0]), total, z=CONFIDENCE_Z)
+        precision_met = (high - low) / 2 <= precision
+        if precision_met:
+            break
+
+        # Iterations needed for the target precision (normal approximation), at least one more batch
+        p = counts[0] / total
+        needed = math.ceil(CONFIDENCE_Z ** 2 * p * (1 - p) / precision ** 2)
+        batch = min(max(needed - total, batch_size), MAX_BATCH_SIZE, iterations - total)
+
+    sim_results = _sim_results(
+        deck_size, n_lands, n_desired_lands, turns, on_play, consider_mulligans, total, *(int(c) for c in counts)
+    )
+    sim_results['out']['iterations'] = total
+    sim_results['out']['ci_desired_land'] = [low, high]
+    sim_results['out']['precision_met'] = precision_met
+    print(f" - Results after {total} iterations: Prob good mana curve = {sim_results['out']['prob_desired_land']} "
+          f"[{low:.4f}, {high:.4f}]" + ('' if precision_met else ' (maximum iterations reached before precision)'))
+
+    return sim_results
+
+
+@cached(decode=lambda turn_results: {int(t): results for t, results in turn_results.items()})
+def simulate_turns(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_play=True,
+                   consider_mulligans=True, iterations=100000, seed=None):
+    """Vectorized simulation that plays each game once up to the last turn and checks every turn on the way.
+
+    The opening hand and mulligans are done once per game, then one card is drawn per draw step and the
+    land counts are recorded after each turn. The same games are used for every turn, so the results for
+    different turns are directly comparable.
+
+    RETURNS:
+        turn_results : dict
+            Dictionary with the `simulate` results for each turn from 1 to turns, i.e., the probability of
+            hitting t lands by turn t.
+    """
+    print(
+        f"Simulation conditions: {deck_size} card deck | {n_lands} lands | {n_desired_lands} desired lands | {'on the play' if on_play else 'on the draw'} | run up to {turns} turns {'with' if consider_mulligans else 'without'} mulligan")
+
+    rng = np.random.default_rng(seed)
+    comb = _comb_table(deck_size)
+    n_other_lands = n_lands - n_desired_lands
+    n_non_lands = deck_size - n_lands
+
+    desired_lands_hand, other_lands_hand, n_mulligans = _opening_hands(
+        rng, comb, n_desired_lands, n_other_lands, n_non_lands, iterations, consider_mulligans
+    )
+    lands_hand = desired_lands_hand + other_lands_hand
+    mull6, mull5, mull4 = (int(np.count_nonzero(n_mulligans >= k)) for k in (1, 2, 3))
+
+    # Cards left in the deck. One non-land card is returned to the deck for each mulligan.
+    desired_left = n_desired_lands - desired_lands_hand
+    lands_left = n_lands - lands_hand
+    cards_left = deck_size - 7 + n_mulligans
+
+    first_draw_turn = 2 if on_play else 1
+    turn_results = {}
+    for t in range(1, turns + 1):
+        # Draw step
+        if t >= first_draw_turn:
+            card = rng.random(iterations) * cards_left
+            is_desired = card < desired_left
+            is_land = card < lands_left
+            desired_lands_hand += is_desired
+            lands_hand += is_land
+            desired_left -= is_desired
+            lands_left -= is_land
+            cards_left -= 1
+
+        # Count iterations where enough lands or desired lands are found by turn t
+        count_games_desired = int(np.count_nonzero(desired_lands_hand >= t))
+        count_games_any = int(np.count_nonzero(lands_hand >= t))
+        turn_results[t] = _sim_results(
+            deck_size, n_lands, n_desired_lands, t, on_play, consider_mulligans, iterations,
+            count_games_desired, count_games_any, mull6, mull5, mull4
+        )
+
+    print(f" - Results after {iterations} iterations: Prob good mana curve = " +
+          ', '.join(f"{res['out']['prob_desired_land']} (turn {t})" for t, res in turn_results.items()))
+
+    return turn_results
+
+
+def _kept_hands(deck_size, n_lands, n_desired_lands, consider_mulligans):
+    """Exact distribution of the kept opening hand, following the mulligan rules of `simulate`.
+
+    RETURNS:
+        kept_hands : list
+            List of (desired lands, other lands, number of mulligans, probability) for every possible kept hand.
+        p_mulligan : float
+            Probability of a mulligan for each 7 card hand.
+    """
+    n_other_lands = n_lands - n_desired_lands
+
+    # Probability of each opening hand (7 cards), by number of desired and other lands
+    hands = []
+    for lands in range(min(7, n_lands) + 1):
+        p_lands = hypergeom_prob(deck_size, n_lands, 7, lands)
+        for desired in range(max(0, lands - n_other_lands), min(lands, n_desired_lands) + 1):
+            p_hand = p_lands * hypergeom_prob(n_lands, n_desired_lands, lands, desired)
+            keep = not consider_mulligans or MIN_LANDS <= lands <= MAX_LANDS
+            hands.append((desired, lands - desired, p_hand, keep))
+    p_mulligan = sum(p_hand for _, _, p_hand, keep in hands if not keep)
+
+    # Probability of keeping a hand after n mulligans. Always keeps after the third mulligan.
+    if consider_mulligans:
+        mulligans = [(0, 1, False), (1, p_mulligan, False), (2, p_mulligan ** 2, False), (3, p_mulligan ** 3, True)]
+    else:
+        mulligans = [(0, 1, True)]
+
+    kept_hands = []
+    for n_mulligans, p_mulligans, keep_any in mulligans:
+        for desired, other, p_hand, keep in hands:
+            if keep or keep_any:
+                kept_hands.append((desired, other, n_mulligans, p_mulligans * p_hand))
+
+    return kept_hands, p_mulligan
+
+
+@cached(ignore=('iterations', 'seed'))
+def exact(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_play=True, consider_mulligans=True,
+          iterations=None, seed=None):
+    """Exact (closed-form) version of `simulate`.
+
+    Computes the probabilities `simulate` estimates directly from the hypergeometric distribution, following
+    the same mulligan rules (never mulligans below 4 cards). Takes the same arguments as `simulate`, but
+    `iterations` and `seed` are ignored. The 'out' dictionary holds probabilities instead of game counts.
+    Draw steps stop once the library is empty.
+    """
+    print(
+        f"Exact conditions: {deck_size} card deck | {n_lands} lands | {n_desired_lands} desired lands | {'on the play' if on_play else 'on the draw'} | run for {turns} turns {'with' if consider_mulligans else 'without'} mulligan")
+
+    first_draw_turn = 2 if on_play else 1
+    n_draws = max(turns + 1 - first_draw_turn, 0)
+    kept_hands, p_mulligan = _kept_hands(deck_size, n_lands, n_desired_lands, consider_mulligans)
+
+    prob_desired = 0
+    prob_any = 0
+    for desired, other, n_mulligans, p_hand in kept_hands:
+        # Draw step for turn 2 onwards. One non-land card is returned to the deck for each mulligan.
+        cards_left = deck_size - 7 + n_mulligans
+        draws = min(n_draws, cards_left)
+        p_desired = 1 - cum_hypergeom_prob(cards_left, n_desired_lands - desired, draws, turns - desired - 1)
+        p_any = 1 - cum_hypergeom_prob(cards_left, n_lands - desired - other, draws, turns - desired - other - 1)
+        prob_desired += p_hand * p_desired
+        prob_any += p_hand * p_any
+
+    print(f" - Exact result: Prob good mana curve = {prob_desired}")
+
+    return {
         'in': {
             'deck_size': deck_size,
             'n_lands': n_lands,
@@ -195,44 +626,172 @@ def simulate(deck_size=None, n_lands=None, n_desired_lands=None, turns=None, on_
             'turns': turns,
             'on_play': on_play,
             'consider_mulligans': consider_mulligans,
-            'iterations': iterations
+            'iterations': None
         },
         'out': {
             'prob_desired_land': prob_desired,
             'prob_any_land': prob_any,
-            'count_games_desired': count_games_desired,
-            'count_games_any': count_games_any,
-            'no_mulligan': iterations - ((mull6 - mull5 - mull4) + (mull5 - mull4) + mull4),
-            'mulligans_to_6': mull6 - mull5 - mull4,
-            'mulligans_to_5': mull5 - mull4,
-            'mulligans_to_4': mull4
+            'prob_no_mulligan': 1 - p_mulligan,
+            'prob_mulligan_to_6': p_mulligan * (1 - p_mulligan),
+            'prob_mulligan_to_5': p_mulligan ** 2 * (1 - p_mulligan),
+            'prob_mulligan_to_4': p_mulligan ** 3
         }
     }
 
-    return sim_results
+
+def exact_lands_prob(deck_size, n_lands, n_desired_lands, turn, min_lands, min_desired_lands, on_play=True,
+                     consider_mulligans=True):
+    """Exact probability of having at least min_lands lands, of which at least min_desired_lands are of the
+    desired type, by a given turn. Follows the same rules as `simulate`.
+
+    For instance, to cast {1}{U}{U} on turn 3 you need 3 lands, 2 of which make blue mana, by turn 3.
+    Draw steps stop once the library is empty.
+    """
+    first_draw_turn = 2 if on_play else 1
+    n_draws = max(turn + 1 - first_draw_turn, 0)
+    kept_hands, _ = _kept_hands(deck_size, n_lands, n_desired_lands, consider_mulligans)
+
+    prob = 0
+    for desired, other, n_mulligans, p_hand in kept_hands:
+        # Lands left in the deck. One non-land card is returned to the deck for each mulligan.
+        cards_left = deck_size - 7 + n_mulligans
+        desired_left = n_desired_lands - desired
+        lands_left = n_lands - desired - other
+        draws = min(n_draws, cards_left)
+
+        # Draw step for turn 2 onwards: l lands drawn, of which enough desired lands
+        for lands_drawn in range(max(0, min_lands - desired - other), min(draws, lands_left) + 1):
+            p_lands = hypergeom_prob(cards_left, lands_left, draws, lands_drawn)
+            p_desired = 1 - cum_hypergeom_prob(lands_left, desired_left, lands_drawn, min_desired_lands - desired - 1)
+            prob += p_hand * p_lands * p_desired
+
+    return prob
+
+
+# Simulation engines available to mana_curve_table
+ENGINES = {
+    'python': simulate,
+    'numpy': simulate_numpy,
+    'exact': exact,
+    'adaptive': simulate_adaptive,
+}
+
+
+def _table_cell(cell):
+    """Run one cell of the mana curve table. Top-level function so it can be sent to worker processes."""
+    engine, kwargs = cell
+    return ENGINES[engine](**kwargs)['out']
 
 
-def mana_curve_table(sim_path, n_lands_range=[], deck_size=60, turns=5, on_play=True, consider_mulligans=True, iterations=100000):
+def _table_row(row):
+    """Run one row of the mana curve table (all turns) with simulate_turns."""
+    first_turn, kwargs = row
+    turn_results = simulate_turns(**kwargs)
+    return [turn_results[t]['out']['prob_desired_land'] for t in range(first_turn, kwargs['turns'] + 1)]
+
+
+def mana_curve_table(sim_path, n_lands_range=[], deck_size=60, turns=5, on_play=True, consider_mulligans=True,
+                     iterations=100000, engine='python', workers=1, seed=None, shared_games=False,
+                     precision=PRECISION, cache_dir=None):
     """Calculate the probability to find at least a certain number of lands after a certain
     number of draw steps. Meaning hitting X lands by turn X.
+
+    engine selects the simulation engine (see ENGINES): 'python' (card by card), 'numpy' (vectorized),
+    'exact' (closed-form probabilities, no sampling) or 'adaptive' (vectorized, runs each cell until the
+    confidence interval half-width is below precision, with iterations as the maximum). The confidence
+    intervals of the adaptive engine are saved to mana_sim_ci.csv.
+
+    If cache_dir is given, cells (or rows) already computed with the same parameters are loaded from
+    the cache and only the missing ones are computed.
+
+    The cells of the table are independent, so with workers > 1 they are split across a pool of processes.
+    If seed is given, each cell gets its own seed derived from it, so the table is the same for any number
+    of workers.
+
+    With shared_games, each row is simulated once up to the last turn with simulate_turns (vectorized)
+    instead of once per turn, so all the turns in a row come from the same games. engine is then ignored.
     """
-    prob_table = []
-    for n_lands in range(n_lands_range[0], n_lands_range[1] + 1):
-        row = []
-        for t in range(2, turns + 1):
-            results = simulate(
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(ENGINES)}.")
+
+    # One seed per cell (or row), spawned from the table seed
+    lands_list = list(range(n_lands_range[0], n_lands_range[1] + 1))
+    turns_list = list(range(2, turns + 1))
+    seeds = np.random.SeedSequence(seed).generate_state(len(lands_list) * len(turns_list))
+
+    if shared_games:
+        rows = []
+        for n_lands in lands_list:
+            rows.append((turns_list[0], dict(
                 deck_size=deck_size,
                 n_lands=n_lands,
                 n_desired_lands=n_lands,
-                turns=t,
+                turns=turns,
                 on_play=on_play,
                 consider_mulligans=consider_mulligans,
-                iterations=iterations
-            )
-            row.append(results['out']['prob_desired_land'])
-        prob_table.append(row)
+                iterations=iterations,
+                seed=int(seeds[len(rows)]) if seed is not None else None,
+                cache_dir=cache_dir
+            )))
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                prob_table = list(executor.map(_table_row, rows))
+        else:
+            prob_table = [_table_row(row) for row in rows]
+        if cache_dir is not None and workers > 1:  # workers only track the size of their own results
+            cache.evict(cache_dir)
 
-    # Save to CSV
+        return _save_table(sim_path, prob_table)
+
+    cells = []
+    for n_lands in lands_list:
+        for t in turns_list:
+            cells.append((engine, dict(
+                deck_size=deck_size,
+                n_lands=n_lands,
+                n_desired_lands=n_lands,
+                turns=t,
+                on_play=on_play,
+                consider_mulligans=consider_mulligans,
+                iterations=iterations,
+                seed=int(seeds[len(cells)]) if seed is not None else None,
+                cache_dir=cache_dir
+            )))
+            if engine == 'adaptive':
+                cells[-1][1]['precision'] = precision
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_table_cell, cells))
+    else:
+        results = [_table_cell(cell) for cell in cells]
+    if cache_dir is not None and workers > 1:
+        cache.evict(cache_dir)
+
+    probs = [out['prob_desired_land'] for out in results]
+    prob_table = [probs[i:i + len(turns_list)] for i in range(0, len(probs), len(turns_list))]
+
+    # Save confidence intervals to a companion CSV
+    if engine == 'adaptive':
+        ci_table_path = sim_path / 'mana_sim_ci.csv'
+        with open(ci_table_path, "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['n_lands', 'turns', 'prob_desired_land', 'ci_low', 'ci_high', 'iterations',
+                             'precision_met'])
+            for (_, kwargs), out in zip(cells, results):
+                writer.writerow([kwargs['n_lands'], kwargs['turns'], out['prob_desired_land'], *out['ci_desired_land'],
+                                 out['iterations'], out['precision_met']])
+        n_imprecise = sum(not out['precision_met'] for out in results)
+        if n_imprecise:
+            print(f"{n_imprecise} cells reached the maximum of {iterations} iterations before precision {precision} "
+                  f"(see {ci_table_path}).")
+
+    return _save_table(sim_path, prob_table)
+
+
+def _save_table(sim_path, prob_table):
+    """Save the mana curve table to CSV."""
     mana_table_path = sim_path / 'mana_sim.csv'
     with open(mana_table_path, "w", newline='') as f:
         writer = csv.writer(f)
@@ -244,4 +803,5 @@ def mana_curve_table(sim_path, n_lands_range=[], deck_size=60, turns=5, on_play=
 if __name__ == '__main__':
     # simulate(deck_size=60, n_lands=20, n_desired_lands=20, turns=5, consider_mulligans=True, iterations=100000)
 
-    mana_curve_table(n_lands_range=[16, 26], deck_size=60, turns=7, on_play=False, consider_mulligans=True, iterations=10000)
+    mana_curve_table(Path('../../data/simulations'), n_lands_range=[16, 26], deck_size=60, turns=7, on_play=False,
+                     consider_mulligans=True, iterations=10000, engine='exact')
@@ -0,0 +1,183 @@
+"""
+Land count optimizer.
+
+Finds the smallest number of lands, or of colored sources, that reaches a target probability, using the
+exact hypergeometric solution from the mana module. These probabilities grow with the number of lands
+(or sources), so the search is a bisection instead of evaluating every land count.
+
+Sources are searched color by color, so for a multicolor cost the resulting land configurations are checked
+jointly with the multicolor simulation of the colors module (colors.sweep, which simulates many land
+configurations at once from the same games).
+"""
+
+from collections import Counter
+from mtg_toolbelt.simulation.colors import COLOR_SYMBOLS, ColorDeck, ManaCost, sweep
+from mtg_toolbelt.simulation.mana import exact_lands_prob
+
+
+def _bisect(prob_func, target, low, high):
+    """Smallest n in [low, high] with prob_func(n) >= target, assuming prob_func is non-decreasing.
+    Returns None if the target can not be reached."""
+    if low > high or prob_func(high) < target:
+        return None
+    while low < high:
+        mid = (low + high) // 2
+        if prob_func(mid) >= target:
+            high = mid
+        else:
+            low = mid + 1
+    return low
+
+
+def min_lands(target, turn, n_lands_needed=None, deck_size=60, on_play=False, consider_mulligans=True):
+    """Smallest number of lands in the deck to have at least n_lands_needed lands (by default, as many as
+    turns) by a given turn with probability target (e.g. 0.9 for 90%)."""
+    if n_lands_needed is None:
+        n_lands_needed = turn
+
+    def prob(n_lands):
+        return exact_lands_prob(deck_size, n_lands, n_lands, turn, n_lands_needed, 0, on_play=on_play,
+                                consider_mulligans=consider_mulligans)
+
+    return _bisect(prob, target, n_lands_needed, deck_size)
+
+
+def min_sources(target, mana_cost, turn, n_lands, deck_size=60, on_play=False, consider_mulligans=True):
+    """Smallest number of sources of each color of a mana cost to cast it on a given turn with probability
+    target, for a deck with n_lands lands.
+
+    Each color is considered on its own: lands that do not make it count only towards the total number
+    of lands. For instance, {1}{U}{U} on turn 3 needs 3 lands, 2 of which make blue mana.
+
+    RETURNS:
+        sources : dict
+            Number of sources by color, e.g. {'U': 14}. None for the colors where the target is not reached.
+    """
+    cost = ManaCost.parse(mana_cost) if isinstance(mana_cost, str) else mana_cost
+
+    sources = {}
+    for color, pips in cost.pips.items():
+        def prob(n_sources):
+            return exact_lands_prob(deck_size, n_lands, n_sources, turn, cost.cmc, pips, on_play=on_play,
+                                    consider_mulligans=consider_mulligans)
+
+        sources[color] = _bisect(prob, target, pips, n_lands) if cost.cmc <= turn else None
+
+    return sources
+
+
+def land_configuration(sources, n_lands):
+    """Lands by the colors they produce (as in ColorDeck.lands) with the given number of sources of each color
+    in n_lands lands. Sources are dealt to the lands in turn, so multicolor lands are only used when there are
+    more sources than lands, and colorless lands ('C') fill the rest.
+
+    For instance, {'W': 15, 'U': 15, 'B': 15} in 22 lands gives {'WUB': 1, 'WU': 7, 'WB': 7, 'UB': 7}."""
+    colors = [''] * n_lands
+    position = 0
+    for color in sorted(sources, key=COLOR_SYMBOLS.index):
+        if sources[color] > n_lands:
+            raise ValueError(f'More {color} sources than lands.')
+        for _ in range(sources[color]):
+            colors[position % n_lands] += color
+            position += 1
+    return dict(Counter(land_colors or 'C' for land_colors in colors))
+
+
+def check_sources(mana_cost, turn, n_lands, candidates, deck_size=60, on_play=False, consider_mulligans=True,
+                  iterations=20000, seed=0):
+    """Probability of casting mana_cost on a given turn, all colors at once, with the land configuration (see
+    land_configuration) of each candidate number of sources by color. All candidates are simulated from the
+    same games, which are also the same for every call with the same seed.
+
+    Only the colors are simulated: the probability is the exact probability of having enough lands (see
+    mana.exact_lands_prob) times the simulated fraction of those games where the colors can be paid.
+
+    RETURNS:
+        list
+            (lands by the colors they produce, probability to cast the spell) for each candidate.
+    """
+    cost = ManaCost.parse(mana_cost) if isinstance(mana_cost, str) else mana_cost
+    lands = [land_configuration(sources, n_lands) for sources in candidates]
+    decks = [ColorDeck(lands=lands_, non_lands=deck_size - n_lands) for lands_ in lands]
+    args = dict(turn=turn, on_play=on_play, consider_mulligans=consider_mulligans, iterations=iterations, seed=seed)
+    probs = sweep(decks, cost, **args)
+    sim_lands_prob, = sweep(decks[:1], ManaCost(generic=cost.cmc, pips={}), **args)
+    lands_prob = exact_lands_prob(deck_size, n_lands, n_lands, turn, cost.cmc, 0, on_play=on_play,
+                                  consider_mulligans=consider_mulligans)
+    return [(lands_, prob * lands_prob / sim_lands_prob if sim_lands_prob else prob)
+            for lands_, prob in zip(lands, probs)]
+
+
+def optimize(target, turn, mana_cost=None, n_lands_needed=None, deck_size=60, on_play=False, consider_mulligans=True):
+    """Find the number of lands, and colored sources for mana_cost if given, that reach a target probability.
+
+    Sources are found for each color on its own (see min_sources). For a cost with several colors, the land
+    configurations they give (see land_configuration) are then simulated with all colors at once: the sources
+    of all colors are raised together by the smallest number that reaches the target, then the number of
+    sources of each color is lowered back to the smallest one that still reaches it. Both searches are
+    bisections over candidates simulated in one batch (see check_sources).
+
+    RETURNS:
+        result : dict
+            'n_lands' (None if the target can not be reached), 'sources' by color and, for a cost with several
+            colors:
+                'lands': land configuration by the colors lands produce, e.g. {'WU': 7, 'W': 8, ...}
+                'multicolor_lands': whether it needs lands making several colors (more sources than lands)
+                'prob': probability to cast the spell with this configuration (colors simulated, see
+                        check_sources)
+                'target_met': whether prob reaches the target (False if it can not be reached with n_lands)
+    """
+    if mana_cost is not None:
+        cost = ManaCost.parse(mana_cost) if isinstance(mana_cost, str) else mana_cost
+        if cost.cmc > turn:  # one land drop per turn
+            return {'n_lands': None, 'sources': {}}
+        if n_lands_needed is None:
+            n_lands_needed = cost.cmc
+    n_lands = min_lands(target, turn, n_lands_needed=n_lands_needed, deck_size=deck_size, on_play=on_play,
+                        consider_mulligans=consider_mulligans)
+
+    sources = {}
+    if mana_cost is not None and n_lands is not None:
+        sources = min_sources(target, mana_cost, turn, n_lands, deck_size=deck_size, on_play=on_play,
+                              consider_mulligans=consider_mulligans)
+
+    result = {'n_lands': n_lands, 'sources': sources}
+    if len(sources) > 1 and None not in sources.values():
+        def check(candidates):
+            return check_sources(mana_cost, turn, n_lands, candidates, deck_size=deck_size, on_play=on_play,
+                                 consider_mulligans=consider_mulligans)
+
+        # Add the same number of sources to all colors
+        min_sources_ = sources
+        max_added = n_lands - min(sources.values())
+        candidates = [{color: min(n + added, n_lands) for color, n in sources.items()}
+                      for added in range(max_added + 1)]
+        checked = check(candidates)
+        added = _bisect(lambda added_: checked[added_][1], target, 0, max_added)
+        sources = candidates[max_added if added is None else added]
+        lands, prob = checked[max_added if added is None else added]
+
+        # Remove the sources each color does not need
+        if added is not None:
+            for color in sorted(sources, key=COLOR_SYMBOLS.index):
+                low = min_sources_[color]
+                candidates = [{**sources, color: n} for n in range(low, sources[color] + 1)]
+                checked = check(candidates)
+                n_sources = _bisect(lambda n: checked[n - low][1], target, low, sources[color])
+                sources = candidates[n_sources - low]
+                lands, prob = checked[n_sources - low]
+        result['sources'] = sources
+        result.update({'lands': lands, 'multicolor_lands': sum(sources.values()) > n_lands, 'prob': prob,
+                       'target_met': prob >= target})
+    return result
+
+
+if __name__ == '__main__':
+    # Lands to hit 4 lands by turn 4 90% of the time
+    print(optimize(0.9, 4))
+
+    # Lands and blue sources to cast {1}{U}{U} on turn 3 90% of the time
+    print(optimize(0.9, 3, mana_cost='{1}{U}{U}'))
+
+    # Three colors: sources of each color on its own, checked jointly
+    print(optimize(0.9, 3, mana_cost='{W}{U}{B}'))
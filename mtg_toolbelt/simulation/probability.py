@@ -1,17 +1,35 @@
 import math
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def comb(n, k):
+    """Memoized binomial coefficient. Returns 0 when k < 0 or k > n."""
+    if k < 0 or k > n:
+        return 0
+    return math.comb(n, k)
 
 
 def hypergeom_prob(pop, succ_pop, sample, succ_sample):
-    return math.comb(succ_pop, succ_sample) * math.comb(pop - succ_pop, sample - succ_sample) / math.comb(pop, sample)
+    return comb(succ_pop, succ_sample) * comb(pop - succ_pop, sample - succ_sample) / comb(pop, sample)
 
 
 def cum_hypergeom_prob(pop, succ_pop, sample, succ_sample):
     cum_prob = 0
     for succ in range(0, succ_sample + 1):
-        cum_prob += math.comb(succ_pop, succ) * math.comb(pop - succ_pop, sample - succ) / math.comb(pop, sample)
+        cum_prob += comb(succ_pop, succ) * comb(pop - succ_pop, sample - succ) / comb(pop, sample)
     return cum_prob
 
 
+def wilson_interval(successes, trials, z=1.96):
+    """Wilson score confidence interval for a binomial proportion. z=1.96 gives a 95% interval."""
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (p + z ** 2 / (2 * trials)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return center - half_width, center + half_width
+
+
 if __name__ == '__main__':
     # Tests
     [pop, succ_pop, sample, succ_sample] = [60, 18, 7, 2]
@@ -26,3 +44,7 @@ if __name__ == '__main__':
 
     prob = 1 - cum_hypergeom_prob(pop, succ_pop, sample, succ_sample - 1)
     print(f"P(x >= k) = {prob:.4f}")
+
+    # Confidence interval of a simulated probability
+    low, high = wilson_interval(4200, 10000)
+    print(f"95% CI = [{low:.4f}, {high:.4f}]")
@@ -2,10 +2,19 @@
 General utilities
 """
 
+from email.utils import parsedate_to_datetime
 import json
 from pathlib import Path
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
 
 
+# Responses retried by RetrySession
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 # List of color family names
 FAMILIES = [
     'white', 'blue', 'black', 'red', 'green', 'selesnya', 'orzhov', 'boros', 'azorius', 'dimir', 'rakdos', 'golgari',
@@ -37,3 +46,100 @@ def setup_dir(dir_name):
     """Create directory if it doesn't exist."""
     dir_path = Path(dir_name)
     dir_path.mkdir(parents=True, exist_ok=True)
+
+
+class TokenBucket:
+    """Thread safe token bucket rate limiter: acquire() blocks until a token is available. Tokens are added at
+    rate per second, up to capacity."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after(response):
+    """Seconds to wait before retrying a response according to its Retry-After header (a number of seconds or
+    an HTTP date), or None if it has none."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetrySession:
+    """
+    Pooled requests session shared by many threads, with a token bucket rate limit (one for all requests, or
+    one per host with per_host) and retries on 429/5xx responses and connection errors. A retried response
+    is waited for as long as its Retry-After header asks, otherwise with exponential backoff.
+
+    Usage
+    -------
+    session = RetrySession(rate=10, pool_size=8)
+    response = session.request('GET', url)
+    """
+
+    def __init__(self, rate, pool_size=8, per_host=False, max_retries=5, backoff=0.5, timeout=30):
+        self.rate = rate
+        self.per_host = per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.rate_limiters = {}
+        self.lock = threading.Lock()
+
+    def rate_limiter(self, url):
+        host = urlparse(url).netloc if self.per_host else None
+        with self.lock:
+            if host not in self.rate_limiters:
+                self.rate_limiters[host] = TokenBucket(self.rate)
+            return self.rate_limiters[host]
+
+    def request(self, method, url, **kwargs):
+        """Rate limited request, retried on 429/5xx responses and connection errors. Returns the last response
+        if all retries fail."""
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter(url).acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            wait = retry_after(response)
+            response.close()
+            time.sleep(wait if wait is not None else self.backoff * 2 ** attempt)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,95 @@
+"""
+Tests of the card database update against a local stand-in of the Scryfall API and bulk data files.
+"""
+
+import json
+import pytest
+import requests
+from mtg_toolbelt.database import cards, store
+
+
+ORACLE_CARDS = [{'name': f'Card {i}', 'oracle_id': str(i), 'set': 'tst', 'legalities': {'pauper': 'legal'}}
+                for i in range(50)]
+DEFAULT_CARDS = [{**card, 'prices': {'tix': '0.10'}} for card in ORACLE_CARDS]
+BULK_FILES = {'oracle-cards': json.dumps(ORACLE_CARDS).encode(), 'default-cards': json.dumps(DEFAULT_CARDS).encode()}
+
+
+@pytest.fixture
+def scryfall_api(serve):
+    """Stand-in of the bulk-data API and of the bulk data files, which supports byte ranges."""
+    def respond(method, path, headers, body):
+        bulk_type = path.rsplit('/', 1)[-1].replace('.json', '')
+        if path.startswith('/bulk-data/'):
+            bulk_data = {'type': bulk_type, 'updated_at': '2022-07-26T09:00:00+00:00',
+                         'size': len(BULK_FILES[bulk_type]), 'download_uri': f'{api_url}/files/{bulk_type}.json'}
+            return 200, {'Content-Type': 'application/json'}, json.dumps(bulk_data).encode()
+        content = BULK_FILES[bulk_type]
+        if headers.get('Range'):
+            start = int(headers['Range'][len('bytes='):-1])
+            if start >= len(content):
+                return 416, {}, b''
+            return 206, {'Content-Range': f'bytes {start}-{len(content) - 1}/{len(content)}'}, content[start:]
+        return 200, {}, content
+
+    api_url = serve(respond)
+    return api_url
+
+
+def downloads(requests_):
+    return [(path, headers.get('Range')) for _, path, headers, _ in requests_ if path.startswith('/files/')]
+
+
+def test_resume_interrupted_download(scryfall_api, serve, tmp_path, monkeypatch):
+    # Interrupt the first download after two chunks
+    iter_content = requests.Response.iter_content
+
+    def interrupted(response, *args, **kwargs):
+        for i, chunk in enumerate(iter_content(response, *args, **kwargs)):
+            if i == 2:
+                raise requests.exceptions.ChunkedEncodingError('Connection broken')
+            yield chunk
+
+    monkeypatch.setattr(cards, 'CHUNK_SIZE', 64)
+    monkeypatch.setattr(requests.Response, 'iter_content', interrupted)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        cards.update_db(tmp_path, api_url=scryfall_api)
+    assert (tmp_path / 'oracle-cards.json.part').stat().st_size == 128
+    assert not (tmp_path / 'cards.sqlite').exists()
+
+    # The download resumes where it stopped
+    monkeypatch.setattr(requests.Response, 'iter_content', iter_content)
+    del serve.requests[:]
+    cards.update_db(tmp_path, api_url=scryfall_api)
+    assert downloads(serve.requests) == [('/files/oracle-cards.json', 'bytes=128-'),
+                                         ('/files/default-cards.json', None)]
+    assert (tmp_path / 'oracle-cards.json').read_bytes() == BULK_FILES['oracle-cards']
+    assert not (tmp_path / 'oracle-cards.json.part').exists()
+    with store.CardStore(tmp_path / 'cards.sqlite') as card_store:
+        assert card_store.get('Card 3')['oracle_id'] == '3'
+
+    # Nothing to do once the database is built from the latest files
+    del serve.requests[:]
+    cards.update_db(tmp_path, api_url=scryfall_api)
+    assert downloads(serve.requests) == []
+
+
+def test_retry_failed_build(scryfall_api, serve, tmp_path, monkeypatch):
+    # Database built from older data
+    store.build(tmp_path / 'cards.sqlite', [])
+    build = store.build
+
+    def failed_build(*args, **kwargs):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(store, 'build', failed_build)
+    with pytest.raises(OSError):
+        cards.update_db(tmp_path, api_url=scryfall_api)
+
+    # The files are not downloaded again, but the database is built
+    monkeypatch.setattr(store, 'build', build)
+    del serve.requests[:]
+    cards.update_db(tmp_path, api_url=scryfall_api)
+    assert downloads(serve.requests) == []
+    with store.CardStore(tmp_path / 'cards.sqlite') as card_store:
+        assert card_store.get('Card 3')['oracle_id'] == '3'
+    assert 'cards.sqlite' in cards.load_manifest(tmp_path)
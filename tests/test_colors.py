@@ -0,0 +1,42 @@
+"""
+Tests of the multi-color mana simulation.
+"""
+
+import math
+import pytest
+from mtg_toolbelt.simulation.colors import ColorDeck, simulate_cost, sweep
+
+
+ITERATIONS = 20000
+Z = 4  # tolerance in standard errors of the difference of two simulated probabilities
+
+DECKS = [
+    ColorDeck(lands={'U': 9, 'R': 6, 'UR': 2}, non_lands=43),
+    ColorDeck(lands={'U': 3, 'R': 1}, non_lands=56),
+    ColorDeck(lands={'W': 5, 'U': 5, 'B': 4, 'WU': 3}, non_lands=23),  # 40 card deck
+    ColorDeck(lands={'U': 30, 'R': 20}, non_lands=10),
+]
+
+
+@pytest.mark.parametrize('mana_cost, turn, on_play', [('{1}{U}{U}', 3, False), ('{U}{R}', 2, True),
+                                                       ('{W}{U}{B}', 4, True)])
+@pytest.mark.parametrize('consider_mulligans', [True, False])
+def test_sweep_matches_simulate_cost(mana_cost, turn, on_play, consider_mulligans):
+    probs = sweep(DECKS, mana_cost, turn, on_play=on_play, consider_mulligans=consider_mulligans,
+                  iterations=ITERATIONS, seed=1)
+    for deck, prob in zip(DECKS, probs):
+        expected = simulate_cost(deck, mana_cost, turn, on_play=on_play, consider_mulligans=consider_mulligans,
+                                 iterations=ITERATIONS, seed=2, verbose=False)['out']['prob_castable']
+        std_error = math.sqrt(2 * expected * (1 - expected) / ITERATIONS)
+        assert prob == pytest.approx(expected, abs=Z * std_error + 1e-12)
+
+
+def test_sweep_configurations():
+    decks = [ColorDeck(lands={'U': n, 'R': 17 - n}, non_lands=43) for n in range(18)]
+    probs = sweep(decks, '{1}{U}{U}', turn=3, seed=0)
+
+    assert probs == sweep(decks, '{1}{U}{U}', turn=3, seed=0)
+    assert probs[:2] == [0, 0]
+    # Common random numbers: more blue sources never make the spell harder to cast
+    assert probs == sorted(probs)
+    assert sweep([], '{U}', turn=1) == []
@@ -0,0 +1,55 @@
+"""
+Tests of the normalized deck data files.
+"""
+
+import importlib.util
+import json
+import sys
+import pytest
+from mtg_toolbelt.mtgo import deck_data, deck_files
+
+
+def card(quantity, name, **info):
+    return {'quantity': quantity, 'card_name': name, 'name': name, 'cmc': 1.0, 'tix': '0.05', **info}
+
+
+DECKS = [
+    {'name': 'Stompy', 'family': 'Stompy', 'price': '12.34',
+     'mainboard': [card('4', 'Rancor'), card('16', 'Forest', cmc=0.0)],
+     'sideboard': [card('2', 'Hydroblast', tix=None)]},
+    {'name': 'Elves', 'family': 'Elves', 'price': '45.67',
+     'mainboard': [card('4', 'Llanowar Elves'), card('4', 'Rancor'), card('13', 'Forest', cmc=0.0)],
+     'sideboard': []},
+]
+
+
+def installed(module_name):
+    return module_name == 'json' or importlib.util.find_spec(module_name) is not None
+
+
+@pytest.mark.parametrize('format_', [
+    pytest.param(format_, marks=pytest.mark.skipif(not installed(format_), reason=f'{format_} is not installed'))
+    for format_ in deck_files.FORMATS
+])
+def test_round_trip(format_, tmp_path):
+    file_path = deck_files.save_decks(tmp_path, DECKS, format_)
+
+    assert file_path == tmp_path / f'decks_normalized{deck_files.FORMATS[format_]}'
+    assert deck_files.load_decks(file_path) == DECKS
+    assert [card_['name'] for card_ in deck_files.load_normalized(file_path)['cards']] == \
+           ['Rancor', 'Forest', 'Hydroblast', 'Llanowar Elves']
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        deck_files.save_decks(tmp_path, DECKS, 'yaml')
+
+
+def test_missing_serializer_fails_before_parsing(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'msgpack', None)  # import msgpack raises ImportError
+    (tmp_path / 'decks.json').write_text(json.dumps([{'name': deck['name'], 'family': deck['family']}
+                                                     for deck in DECKS]))
+
+    with pytest.raises(ImportError, match='pip install msgpack'):
+        deck_data.parse_deck_files(tmp_path, output_format='msgpack')
+    assert list(tmp_path.iterdir()) == [tmp_path / 'decks.json']
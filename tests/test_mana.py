@@ -0,0 +1,57 @@
+"""
+Tests of the mana curve engines: the simulation engines are checked against the exact (closed-form) engine.
+"""
+
+import math
+import pytest
+from mtg_toolbelt.simulation import mana
+from mtg_toolbelt.simulation.mana import exact, exact_lands_prob
+
+
+ITERATIONS = 20000
+SEED = 1
+Z = 4  # tolerance in standard errors of the simulated probability
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy'])
+@pytest.mark.parametrize('on_play', [True, False])
+@pytest.mark.parametrize('n_desired_lands', [17, 10])
+@pytest.mark.parametrize('turns', range(1, 8))
+def test_engines_match_exact(engine, on_play, n_desired_lands, turns):
+    args = dict(deck_size=60, n_lands=17, n_desired_lands=n_desired_lands, turns=turns, on_play=on_play,
+                consider_mulligans=True)
+    prob_exact = exact(**args)['out']['prob_desired_land']
+    prob_sim = mana.ENGINES[engine](iterations=ITERATIONS, seed=SEED, **args)['out']['prob_desired_land']
+
+    std_error = math.sqrt(prob_exact * (1 - prob_exact) / ITERATIONS)
+    assert prob_sim == pytest.approx(prob_exact, abs=Z * std_error + 1e-12)
+
+
+@pytest.mark.parametrize('consider_mulligans', [True, False])
+def test_no_lands(consider_mulligans):
+    assert exact_lands_prob(60, 0, 0, 3, 1, 0, consider_mulligans=consider_mulligans) == 0
+    assert exact_lands_prob(60, 0, 0, 3, 0, 0, consider_mulligans=consider_mulligans) == pytest.approx(1)
+
+
+@pytest.mark.parametrize('consider_mulligans', [True, False])
+def test_only_lands(consider_mulligans):
+    for turn in range(1, 8):
+        assert exact_lands_prob(60, 60, 60, turn, turn, turn, consider_mulligans=consider_mulligans) == \
+               pytest.approx(1)
+    # All the lands are drawn, but not necessarily the desired ones
+    assert exact_lands_prob(60, 60, 20, 3, 3, 3, consider_mulligans=consider_mulligans) < 1
+
+
+@pytest.mark.parametrize('on_play', [True, False])
+@pytest.mark.parametrize('consider_mulligans', [True, False])
+def test_turn_beyond_library(on_play, consider_mulligans):
+    # The whole library is drawn: all 17 lands, and no more
+    args = dict(deck_size=60, n_lands=17, n_desired_lands=10, turn=70, on_play=on_play,
+                consider_mulligans=consider_mulligans)
+    assert exact_lands_prob(min_lands=17, min_desired_lands=10, **args) == pytest.approx(1)
+    assert exact_lands_prob(min_lands=18, min_desired_lands=0, **args) == 0
+    assert exact_lands_prob(min_lands=0, min_desired_lands=11, **args) == 0
+
+    results = exact(deck_size=60, n_lands=17, n_desired_lands=17, turns=70, on_play=on_play,
+                    consider_mulligans=consider_mulligans)
+    assert results['out']['prob_any_land'] == 0
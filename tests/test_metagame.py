@@ -0,0 +1,43 @@
+"""
+Tests of the metagame card counts.
+"""
+
+import pytest
+from mtg_toolbelt.metagame.metagame import CardCounts, get_card_counts
+
+
+DECKS = [
+    {'mainboard': [[4, 'Rancor'], [16, 'Forest'], [4, 'Quirion Ranger']], 'sideboard': [[2, 'Hydroblast']]},
+    {'mainboard': [[4, 'Lightning Bolt'], [4, 'Rancor'], [2, 'Forest'], [12, 'Forest']], 'sideboard': []},
+    {'mainboard': [[4, 'Lightning Bolt'], [20, 'Mountain']]},
+]
+
+
+def test_counts():
+    counts = CardCounts(iter(DECKS))
+    assert counts.n_decks == 3
+    assert counts.top('mainboard', 'total_count', k=2) == [
+        ('Forest', {'total_count': 30, 'unique_count': 2, 'frequency': 2 / 3}),
+        ('Mountain', {'total_count': 20, 'unique_count': 1, 'frequency': 1 / 3}),
+    ]
+    # Ties keep the order of first appearance
+    assert [card for card, _ in counts.top('mainboard', 'unique_count')] == \
+           ['Rancor', 'Forest', 'Lightning Bolt', 'Quirion Ranger', 'Mountain']
+    assert counts.top('sideboard') == [('Hydroblast', {'total_count': 2, 'unique_count': 1, 'frequency': 1 / 3})]
+    assert counts.top('mainboard', k=0) == []
+
+
+def test_only_requested_boards():
+    counts = CardCounts(DECKS, boards=['mainboard'])
+    with pytest.raises(ValueError):
+        counts.top('sideboard')
+    with pytest.raises(ValueError):
+        CardCounts(DECKS, boards=['maybeboard'])
+
+
+def test_get_card_counts():
+    assert get_card_counts(DECKS, 'mainboard', 'unique_count', top=2) == {
+        'Rancor': {'total_count': 8, 'unique_count': 2},
+        'Forest': {'total_count': 30, 'unique_count': 2},
+    }
+    assert get_card_counts([]) == {}
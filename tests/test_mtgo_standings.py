@@ -0,0 +1,100 @@
+"""
+Tests of standings fetching (against a local standings server) and of the standings stream (standings.jsonl).
+"""
+
+from datetime import datetime
+import json
+from pathlib import Path
+import time
+from urllib.parse import urlparse
+from mtg_toolbelt.metagame import mtgo_standings
+from mtg_toolbelt.metagame.event_store import EventStore
+
+
+HEADER = {'format': 'pauper', 'start_date': '2022-07-25', 'end_date': '2022-07-26'}
+
+
+def event_line(event, n_decks=2):
+    decks = [{'mainboard': [[4, 'Rancor']], 'sideboard': [], 'author': f'player{i}', 'source': event}
+             for i in range(n_decks)]
+    return json.dumps({'event': event, 'decks': decks}) + '\n'
+
+
+def test_resume_after_truncated_last_line(tmp_path):
+    stream_path = tmp_path / mtgo_standings.STREAM_FILE
+    complete = (json.dumps(HEADER) + '\n' + event_line('pauper-league-2022-07-25')
+                + event_line('pauper-league-2022-07-26'))
+    stream_path.write_text(complete + event_line('pauper-challenge-2022-07-26')[:40])
+
+    done = mtgo_standings.completed_events(stream_path, HEADER)
+
+    assert done == {'pauper-league-2022-07-25', 'pauper-league-2022-07-26'}
+    assert stream_path.read_text() == complete
+    header, decks = mtgo_standings.read_stream(stream_path)
+    assert header == HEADER
+    assert [deck['author'] for deck in decks] == ['player0', 'player1'] * 2
+
+
+def test_resume_drops_last_line_without_newline(tmp_path):
+    stream_path = tmp_path / mtgo_standings.STREAM_FILE
+    complete = json.dumps(HEADER) + '\n' + event_line('pauper-league-2022-07-25')
+    stream_path.write_text(complete + event_line('pauper-league-2022-07-26').rstrip('\n'))
+
+    assert mtgo_standings.completed_events(stream_path, HEADER) == {'pauper-league-2022-07-25'}
+    assert stream_path.read_text() == complete
+
+
+def test_no_stream_to_resume(tmp_path):
+    stream_path = tmp_path / mtgo_standings.STREAM_FILE
+    assert mtgo_standings.completed_events(stream_path, HEADER) is None
+
+    # Stream of other dates
+    stream_path.write_text(json.dumps({**HEADER, 'end_date': '2022-08-01'}) + '\n' + event_line('x'))
+    assert mtgo_standings.completed_events(stream_path, HEADER) is None
+
+    stream_path.write_text('')
+    assert mtgo_standings.completed_events(stream_path, HEADER) is None
+
+
+def test_update_events(serve, tmp_path):
+    """Fetching against a local standings server: 5xx responses and 429 (with Retry-After) are retried, pages
+    are stored with their ETag, 404 is stored as not_found, and stored pages are revalidated (304)."""
+    page = (Path(__file__).parent / 'standings_pages' / 'pauper-league.html').read_bytes()
+    attempts = {}
+
+    def respond(method, path, headers, body):
+        attempts[path] = attempts.get(path, 0) + 1
+        if '-league-' in path:
+            if attempts[path] == 1:
+                return 503, {}, b''
+            if headers.get('If-None-Match') == '"v1"':
+                return 304, {}, b''
+            return 200, {'ETag': '"v1"'}, page
+        if attempts[path] == 1:
+            return 429, {'Retry-After': '1'}, b''
+        return 404, {}, b'<html>Not found</html>'
+
+    standings_url = serve(respond) + '/standings/'
+    today = datetime.now()
+    league_url, challenge_url = mtgo_standings.event_urls(today, today, 'pauper', standings_url=standings_url)
+
+    with EventStore(tmp_path / 'events.sqlite') as event_store:
+        start_time = time.monotonic()
+        events = dict(mtgo_standings.update_events([league_url, challenge_url], event_store))
+        assert time.monotonic() - start_time >= 1  # Retry-After
+
+        assert list(events) == [league_url]
+        assert [deck['author'] for deck in events[league_url]] == ['elf_player (5-0)', 'Jötun_fan (5-0)']
+        assert attempts == {urlparse(league_url).path: 2, urlparse(challenge_url).path: 2}
+        assert event_store.get_state(league_url)['etag'] == '"v1"'
+        assert event_store.get_state(challenge_url)['status'] == 'not_found'
+
+        # Recent events: the fetched one is revalidated, the one not found is not requested again before its TTL
+        checked_at = event_store.get_state(league_url)['checked_at']
+        events = dict(mtgo_standings.update_events([league_url, challenge_url], event_store))
+        assert events == {league_url: None}
+        assert attempts == {urlparse(league_url).path: 3, urlparse(challenge_url).path: 2}
+        assert serve.requests[-1][2]['If-None-Match'] == '"v1"'
+        assert event_store.get_state(league_url)['checked_at'] > checked_at
+        assert [deck['author'] for deck in event_store.get_decks(league_url)] == ['elf_player (5-0)',
+                                                                                   'Jötun_fan (5-0)']
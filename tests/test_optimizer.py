@@ -0,0 +1,34 @@
+"""
+Tests of the land count optimizer.
+"""
+
+import pytest
+from mtg_toolbelt.simulation import optimizer
+from mtg_toolbelt.simulation.mana import exact_lands_prob
+
+
+def test_min_lands():
+    n_lands = optimizer.min_lands(0.9, 4)
+    assert exact_lands_prob(60, n_lands, n_lands, 4, 4, 0, on_play=False) >= 0.9
+    assert exact_lands_prob(60, n_lands - 1, n_lands - 1, 4, 4, 0, on_play=False) < 0.9
+
+
+def test_land_configuration():
+    assert optimizer.land_configuration({'W': 15, 'U': 15, 'B': 15}, 22) == {'WUB': 1, 'WU': 7, 'WB': 7, 'UB': 7}
+    assert optimizer.land_configuration({'U': 10}, 17) == {'U': 10, 'C': 7}
+    with pytest.raises(ValueError):
+        optimizer.land_configuration({'U': 18}, 17)
+
+
+@pytest.mark.parametrize('mana_cost, turn', [('{W}{U}{B}', 3), ('{W}{U}{B}', 4), ('{1}{U}{U}{B}', 4),
+                                             ('{W}{U}{B}{R}', 4)])
+def test_multicolor_sources(mana_cost, turn):
+    result = optimizer.optimize(0.9, turn, mana_cost=mana_cost)
+    assert result['target_met']
+
+    # Each color needs all its sources (with the same simulated games)
+    sources, n_lands = result['sources'], result['n_lands']
+    candidates = [{**sources, color: sources[color] - 1} for color in sources]
+    checked = optimizer.check_sources(mana_cost, turn, n_lands, [sources] + candidates)
+    assert checked[0] == (result['lands'], result['prob'])
+    assert all(prob < 0.9 for _, prob in checked[1:])
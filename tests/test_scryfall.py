@@ -0,0 +1,61 @@
+"""
+Tests of the Scryfall API client against a local stand-in of the API.
+"""
+
+import json
+import time
+from mtg_toolbelt.database.scryfall import COLLECTION_SIZE, ScryfallClient
+
+
+def card(name, faces=()):
+    card_ = {'object': 'card', 'name': name, 'set': 'tst', 'prices': {'tix': '0.10'}}
+    if faces:
+        card_['card_faces'] = [{'name': face} for face in faces]
+    return card_
+
+
+# Cards of the stand-in API, by name and by face name
+CARDS = {f'Card {i}': card(f'Card {i}') for i in range(200)}
+CARDS['Fire // Ice'] = card('Fire // Ice', faces=('Fire', 'Ice'))
+CARDS_BY_NAME = {**CARDS, 'Fire': CARDS['Fire // Ice'], 'Ice': CARDS['Fire // Ice']}
+
+
+def collection_api(method, path, headers, body):
+    identifiers = json.loads(body)['identifiers']
+    if len(identifiers) > COLLECTION_SIZE:
+        return 422, {}, b'{"object": "error", "status": 422}'
+    names = [identifier['name'] for identifier in identifiers]
+    content = {'data': [CARDS_BY_NAME[name] for name in names if name in CARDS_BY_NAME],
+               'not_found': [{'name': name} for name in names if name not in CARDS_BY_NAME]}
+    return 200, {'Content-Type': 'application/json'}, json.dumps(content).encode()
+
+
+def test_collection_batching(serve):
+    client = ScryfallClient(api_url=serve(collection_api))
+    names = [f'Card {i}' for i in range(160)] + ['Fire', 'Card 3', 'Missing card']
+
+    found, not_found = client.collection(names)
+
+    # 162 unique names in chunks of at most 75 identifiers
+    requests = serve.requests
+    assert [(method, path) for method, path, _, _ in requests] == [('POST', '/cards/collection')] * 3
+    assert [len(json.loads(body)['identifiers']) for _, _, _, body in requests] == [75, 75, 12]
+    assert not_found == ['Missing card']
+    assert found['Fire']['name'] == 'Fire // Ice'
+    assert set(found) == set(names) - {'Missing card'}
+
+
+def test_retry_after(serve):
+    attempts = []
+
+    def rate_limited_api(method, path, headers, body):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            return 429, {'Retry-After': '1'}, b'{"object": "error", "status": 429}'
+        return 200, {'Content-Type': 'application/json'}, json.dumps(CARDS['Card 1']).encode()
+
+    client = ScryfallClient(api_url=serve(rate_limited_api), backoff=0.01)
+
+    assert client.get_json('cards/named', params={'exact': 'Card 1'}) == CARDS['Card 1']
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 1
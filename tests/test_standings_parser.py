@@ -0,0 +1,33 @@
+"""
+Golden file tests of the standings page parsers: every installed backend must give the expected decks of the
+saved pages in standings_pages (each page.html has its expected decks in page.json).
+"""
+
+import json
+from pathlib import Path
+import pytest
+from mtg_toolbelt.metagame.standings_parser import available_parsers, parse_decklists
+
+
+PAGES_PATH = Path(__file__).parent / 'standings_pages'
+PAGES = sorted(PAGES_PATH.glob('*.html'))
+
+
+def expected_decks(page_path):
+    with open(page_path.with_suffix('.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('parser', available_parsers())
+@pytest.mark.parametrize('page_path', PAGES, ids=[page_path.stem for page_path in PAGES])
+def test_golden_pages(page_path, parser):
+    decks = parse_decklists(page_path.read_bytes(), page_path.name, parser=parser)
+    assert [deck.source for deck in decks] == [page_path.name] * len(decks)
+    assert [{'author': deck.author, 'mainboard': [list(card) for card in deck.mainboard],
+             'sideboard': [list(card) for card in deck.sideboard]} for deck in decks] == expected_decks(page_path)
+
+
+@pytest.mark.parametrize('parser', available_parsers())
+@pytest.mark.parametrize('content', [b'', b' \n', b'<!-- no decks -->', ''])
+def test_empty_pages(content, parser):
+    assert parse_decklists(content, 'empty', parser=parser) == []